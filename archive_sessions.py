@@ -0,0 +1,87 @@
+import argparse
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from db import sessions_table
+from encoding import encode_default
+from config import SESSION_ARCHIVE_AFTER_DAYS, ARCHIVE_DIR, ARCHIVE_SCAN_SEGMENTS
+
+
+SCAN_PAGE_SIZE = 500
+
+
+# SESSION ARCHIVAL
+# Moves expired sessions and sessions created more than `older_than_days`
+# ago out of the Sessions table into gzipped NDJSON files, one per scan
+# segment, scanning the segments in parallel. A segment's sessions are only
+# deleted once its file has been written and closed, and each delete is
+# conditioned on the session being unchanged since the scan: one answered in
+# between stays in the table (a later run archives its newer copy).
+def should_archive(item, now, cutoff):
+    if "expires_at" in item and item["expires_at"] <= now:
+        return True
+    return item.get("created_at", "") < cutoff
+
+
+# Condition matching the session as scanned: its version counter, or for
+# legacy sessions without one, the attribute holding their responses
+def unchanged_since(item):
+    for attribute in ("version", "responses", "prompts"):
+        if attribute in item:
+            return [((attribute,), item[attribute])]
+    return []
+
+
+def archive_segment(segment, total_segments, path, now, cutoff, delete):
+    scanned = []
+    with gzip.open(path, "wt", encoding="utf-8") as archive:
+        for item in sessions_table.iter_scan(segment, total_segments, SCAN_PAGE_SIZE):
+            if should_archive(item, now, cutoff):
+                archive.write(json.dumps(item, default=encode_default) + "\n")
+                scanned.append((sessions_table.key_of(item), unchanged_since(item)))
+
+    if not scanned:
+        os.remove(path)
+    changed = 0
+    if delete:
+        for key, expected in scanned:
+            old_item = sessions_table.delete_if(key, expected)
+            if old_item and not sessions_table.expected_hold(old_item, expected):
+                changed += 1
+    return len(scanned), changed
+
+
+def archive_sessions(older_than_days=SESSION_ARCHIVE_AFTER_DAYS, output_dir=ARCHIVE_DIR,
+                     segments=ARCHIVE_SCAN_SEGMENTS, delete=True):
+    now = time.time()
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat() + "Z"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = [os.path.join(output_dir, f"sessions-{stamp}-{segment:03d}.ndjson.gz") for segment in range(segments)]
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = list(executor.map(
+            lambda segment: archive_segment(segment, segments, paths[segment], now, cutoff, delete),
+            range(segments)
+        ))
+
+    archived = sum(count for count, _ in results)
+    changed = sum(changed for _, changed in results)
+    files = sum(1 for count, _ in results if count)
+    print(f"Archived {archived} sessions to {files} files in {output_dir}; "
+          f"{changed} changed since the scan were kept.")
+    return archived
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive expired and old sessions to gzipped NDJSON.")
+    parser.add_argument("--older-than-days", type=int, default=SESSION_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--output-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--segments", type=int, default=ARCHIVE_SCAN_SEGMENTS)
+    parser.add_argument("--keep", action="store_true", help="write the archive without deleting the sessions")
+    args = parser.parse_args()
+
+    archive_sessions(args.older_than_days, args.output_dir, args.segments, delete=not args.keep)
@@ -1,12 +1,16 @@
 from flask import Blueprint, request, jsonify, session, abort
-from jose import jwt
-import boto3
-import requests
-from config import REGION, USER_POOL_ID, CLIENT_ID, JWKS
-from utils import login_required, verify_token
+from concurrent.futures import Future
+import hashlib
+import math
+import threading
+import time
+from config import CLIENT_ID, REFRESH_REUSE_SECONDS, REFRESH_RATE_LIMIT, REFRESH_RATE_WINDOW
+from utils import login_required, get_verified_claims
+from aws import lazy_client
+from metrics import timed
 
 auth_bp = Blueprint("auth", __name__)
-cognito_client = boto3.client('cognito-idp', region_name=REGION)
+cognito_client = lazy_client('cognito-idp')
 
 
 # Register New User 
@@ -39,9 +43,12 @@ def login_user(email, password):
                 'PASSWORD': password
             }
         )
+        result = response["AuthenticationResult"]
         return {
-            "access_token": response["AuthenticationResult"]["AccessToken"],
-            "id_token": response["AuthenticationResult"]["IdToken"]
+            "access_token": result["AccessToken"],
+            "id_token": result["IdToken"],
+            "refresh_token": result["RefreshToken"],
+            "expires_in": result["ExpiresIn"]
         }
 
     except cognito_client.exceptions.UserNotConfirmedException:
@@ -57,6 +64,132 @@ def login_user(email, password):
         return {"error": f"Login failed: {str(e)}"}, 500
 
 
+# REFRESH COALESCING
+# Concurrent refreshes with the same refresh token (e.g. several tabs whose
+# access token expired together) share one Cognito call, and its result is
+# reused for REFRESH_REUSE_SECONDS. Each refresh token may reach Cognito at
+# most REFRESH_RATE_LIMIT times per REFRESH_RATE_WINDOW seconds.
+class RefreshCoalescer:
+    def __init__(self, refresh, reuse_seconds, rate_limit, rate_window):
+        self.refresh = refresh
+        self.reuse_seconds = reuse_seconds
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._recent = {}
+        self._calls = {}
+
+        self.calls = 0
+        self.coalesced = 0
+        self.limited = 0
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _prune(self, now):
+        self._recent = {digest: entry for digest, entry in self._recent.items() if entry[0] > now}
+        self._calls = {
+            digest: [started for started in calls if started > now - self.rate_window]
+            for digest, calls in self._calls.items()
+        }
+        self._calls = {digest: calls for digest, calls in self._calls.items() if calls}
+
+    # Returns the refresh result, or raises RefreshRateLimited
+    def get(self, refresh_token):
+        digest = self._digest(refresh_token)
+        now = time.monotonic()
+
+        with self._lock:
+            self._prune(now)
+            if digest in self._recent:
+                self.coalesced += 1
+                return self._recent[digest][1]
+
+            future = self._in_flight.get(digest)
+            leader = future is None
+            if leader:
+                calls = self._calls.setdefault(digest, [])
+                if len(calls) >= self.rate_limit:
+                    self.limited += 1
+                    raise RefreshRateLimited(calls[0] + self.rate_window - now)
+                calls.append(now)
+                self.calls += 1
+
+                future = Future()
+                self._in_flight[digest] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self.refresh(refresh_token)
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[digest]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[digest]
+            self._recent[digest] = (time.monotonic() + self.reuse_seconds, result)
+        future.set_result(result)
+        return result
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "limited": self.limited,
+        }
+
+
+class RefreshRateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too many refresh attempts")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+# Exchange a Refresh Token for New Access and ID Tokens
+def refresh_with_cognito(refresh_token):
+    with timed("cognito.refresh"):
+        response = cognito_client.initiate_auth(
+            ClientId=CLIENT_ID,
+            AuthFlow='REFRESH_TOKEN_AUTH',
+            AuthParameters={
+                'REFRESH_TOKEN': refresh_token
+            }
+        )
+    result = response["AuthenticationResult"]
+    return {
+        "access_token": result["AccessToken"],
+        "id_token": result["IdToken"],
+        "expires_in": result["ExpiresIn"]
+    }
+
+
+refresh_coalescer = RefreshCoalescer(
+    refresh_with_cognito, REFRESH_REUSE_SECONDS, REFRESH_RATE_LIMIT, REFRESH_RATE_WINDOW
+)
+
+
+def refresh_user_tokens(refresh_token):
+    try:
+        return refresh_coalescer.get(refresh_token)
+
+    except RefreshRateLimited as e:
+        return {"error": "Too many refresh attempts. Please retry later."}, 429, e.retry_after
+
+    except cognito_client.exceptions.NotAuthorizedException:
+        return {"error": "Refresh token is invalid or expired."}, 401
+
+    except Exception as e:
+        return {"error": f"Refresh failed: {str(e)}"}, 500
+
+
 # --------------------
 # Auth Endpoints
 # --------------------
@@ -80,13 +213,31 @@ def login():
     return jsonify(result)
 
 
+# Returns new access and ID tokens for a refresh token from /login, without
+# the password. Clients should refresh shortly before expires_in runs out and
+# share one refresh between concurrent requests.
+@auth_bp.route('/refresh', methods=["POST"])
+def refresh():
+    data = request.get_json(silent=True) or {}
+    if not data.get("refresh_token"):
+        return jsonify({"error": "Missing refresh_token"}), 400
+
+    result = refresh_user_tokens(data["refresh_token"])
+
+    if isinstance(result, tuple):
+        response = jsonify(result[0])
+        if len(result) > 2:
+            response.headers["Retry-After"] = str(result[2])
+        return response, result[1]
+
+    return jsonify(result)
+
+
 @auth_bp.route("/me", methods=["GET"])
 @login_required
 def me():
-    auth_header = request.headers.get("Authorization", "")
-    token = auth_header.replace("Bearer ", "")
     try:
-        claims = verify_token(token)
+        claims = get_verified_claims()
         return jsonify({
             "user_id": claims["sub"],
             "email": claims.get("email")
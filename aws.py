@@ -0,0 +1,93 @@
+import threading
+import boto3
+from botocore.config import Config
+from config import (
+    REGION, BOTO_MAX_POOL_CONNECTIONS, BOTO_CONNECT_TIMEOUT, BOTO_READ_TIMEOUT,
+    BOTO_RETRY_MODE, BOTO_MAX_ATTEMPTS
+)
+
+
+# AWS CLIENT REGISTRY
+# Every module shares one lazily built client/resource per service, so cold
+# start doesn't pay for loading botocore models and connection pools that the
+# request never uses.
+BOTO_CONFIG = Config(
+    region_name=REGION,
+    max_pool_connections=BOTO_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=BOTO_CONNECT_TIMEOUT,
+    read_timeout=BOTO_READ_TIMEOUT,
+    retries={
+        "mode": BOTO_RETRY_MODE,
+        "max_attempts": BOTO_MAX_ATTEMPTS
+    }
+)
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            _session = boto3.session.Session(region_name=REGION)
+        return _session
+
+
+def get_resource(service):
+    resource = _resources.get(service)
+    if resource is not None:
+        return resource
+
+    session = get_session()
+    with _lock:
+        if service not in _resources:
+            _resources[service] = session.resource(service, config=BOTO_CONFIG)
+        return _resources[service]
+
+
+def get_client(service):
+    client = _clients.get(service)
+    if client is not None:
+        return client
+
+    # Reuse the resource's client (and its connection pool) when one exists
+    if service in _resources:
+        client = _resources[service].meta.client
+    else:
+        client = get_session().client(service, config=BOTO_CONFIG)
+
+    with _lock:
+        return _clients.setdefault(service, client)
+
+
+# LAZY HANDLES
+# Stand-ins for module-level clients and tables that build the real object on
+# first attribute access, e.g. `prompts_table = LazyHandle(lambda: ...)`.
+class LazyHandle:
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+def lazy_client(service):
+    return LazyHandle(lambda: get_client(service))
+
+
+def lazy_resource(service):
+    return LazyHandle(lambda: get_resource(service))
+
+
+def lazy_table(name):
+    return LazyHandle(lambda: get_resource("dynamodb").Table(name))
@@ -0,0 +1,83 @@
+"""Cold start benchmark.
+
+Measures, in fresh interpreter processes, how long it takes to import the app,
+serve its first request and build the shared DynamoDB resource. Run from the
+repository root:
+
+    python benchmarks/cold_start.py --runs 10 --output cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside each child process and prints its timings as JSON
+PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+response = main.app.test_client().get("/")
+first_request = time.perf_counter()
+import aws
+aws.get_resource("dynamodb")
+aws.get_client("cognito-idp")
+clients = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first_request - imported) * 1000,
+    "import_to_first_request_ms": (first_request - start) * 1000,
+    "aws_clients_ms": (clients - first_request) * 1000,
+    "status": response.status_code,
+}))
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("COGNITO_REGION", "us-east-1")
+    env.setdefault("AWS_DEFAULT_REGION", env["COGNITO_REGION"])
+
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    summary = {}
+    for metric in samples[0]:
+        if metric == "status":
+            continue
+        values = sorted(sample[metric] for sample in samples)
+        summary[metric] = {
+            "min": values[0],
+            "median": statistics.median(values),
+            "max": values[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    result = {"benchmark": "cold_start", "runs": args.runs, "metrics": summarize(samples)}
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Route load and latency benchmark.
+
+Drives the Flask app in-process against local stand-ins: the in-memory
+storage backend instead of DynamoDB, and a local JWKS endpoint whose key signs
+the RS256 test tokens instead of Cognito. Reports throughput and p50/p95/p99
+latency per route for catalogs of several sizes, and writes the full results
+as JSON with --output. Run from the repository root:
+
+    python benchmarks/routes.py --sizes seed,10000,100000 --output routes.json
+    python benchmarks/routes.py --baseline routes.json   # flag p95 regressions
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+REGION = "us-east-1"
+USER_POOL_ID = "us-east-1_benchmark"
+CLIENT_ID = "benchmark-client"
+KEY_ID = "benchmark-key"
+LEVELS = ["ice", "confess", "deep"]
+
+
+# LOCAL COGNITO STAND-IN
+# Serves a JWKS holding a freshly generated RSA key, and signs tokens with it
+def b64_int(number):
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def start_jwks_server():
+    import rsa
+
+    public_key, private_key = rsa.newkeys(2048)
+    jwks = json.dumps({"keys": [{
+        "kid": KEY_ID, "kty": "RSA", "alg": "RS256", "use": "sig",
+        "n": b64_int(public_key.n), "e": b64_int(public_key.e)
+    }]}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(jwks)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/jwks.json", private_key.save_pkcs1().decode()
+
+
+def sign_token(private_pem, user_id):
+    from jose import jwt
+
+    now = int(time.time())
+    claims = {
+        "sub": user_id,
+        "email": f"{user_id}@example.com",
+        "aud": CLIENT_ID,
+        "iss": f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": KEY_ID})
+
+
+# CATALOG
+def load_catalog(size):
+    from config import ADMIN_USER_ID
+    from catalog import user_level_key
+    from db import prompts_table
+    from prompts import admin_catalog
+    from seed_prompts import seed_prompts_data
+
+    if size == "seed":
+        seed_prompts_data()
+    else:
+        for n in range(int(size)):
+            level = LEVELS[n % len(LEVELS)]
+            prompts_table.put({
+                "prompt_id": f"bench-{n}",
+                "text": f"Benchmark prompt number {n}?",
+                "level": level,
+                "user_id": ADMIN_USER_ID,
+                "user_level": user_level_key(ADMIN_USER_ID, level),
+                "public": True,
+            })
+    admin_catalog.invalidate()
+
+
+def reset_storage():
+    from storage import TABLES, open_table
+
+    for name in TABLES:
+        open_table(name).clear()
+
+
+# SCENARIOS
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(app, name, make_request, requests, concurrency):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(n):
+        nonlocal errors
+        client = app.test_client()
+        start = time.perf_counter()
+        response = make_request(client, n)
+        response.get_data()  # streamed bodies are only produced when read
+        status = response.status_code
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "route": name,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": requests / wall if wall else None,
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def benchmark_size(app, size, tokens, requests, concurrency):
+    reset_storage()
+    load_catalog(size)
+
+    def headers(n):
+        return {"Authorization": f"Bearer {tokens[n % len(tokens)]}"}
+
+    # Sessions answered by the respond scenario, one prompt per request
+    answerable = []
+    for n in range(0, requests, 10):
+        session_id = str(uuid.uuid4())
+        client = app.test_client()
+        client.post(f"/sessions/new/{session_id}", headers=headers(n))
+        prompts = client.get(f"/sessions/{session_id}", headers=headers(n)).get_json()["prompts"]
+        answerable.extend((n, session_id, prompt["prompt_id"]) for prompt in prompts)
+
+    def respond(client, n):
+        owner, session_id, prompt_id = answerable[n % len(answerable)]
+        return client.post(
+            f"/sessions/{session_id}/respond",
+            json={"prompt_id": prompt_id, "response": "Benchmark answer"},
+            headers=headers(owner)
+        )
+
+    scenarios = [
+        ("GET /prompts/", lambda client, n: client.get("/prompts/", headers=headers(n))),
+        ("GET /prompts/?limit=50", lambda client, n: client.get("/prompts/?limit=50", headers=headers(n))),
+        ("GET /prompts/random", lambda client, n: client.get("/prompts/random?level=deep", headers=headers(n))),
+        ("POST /sessions/new", lambda client, n: client.post(f"/sessions/new/{uuid.uuid4()}", headers=headers(n))),
+        ("POST /sessions/<id>/respond", respond),
+    ]
+
+    return {
+        "catalog_size": size,
+        "routes": [run_scenario(app, name, fn, requests, concurrency) for name, fn in scenarios],
+    }
+
+
+# REGRESSIONS
+def compare(result, baseline, threshold):
+    previous = {
+        (size["catalog_size"], route["route"]): route
+        for size in baseline["results"] for route in size["routes"]
+    }
+
+    regressions = []
+    for size in result["results"]:
+        for route in size["routes"]:
+            before = previous.get((size["catalog_size"], route["route"]))
+            if before and route["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append({
+                    "catalog_size": size["catalog_size"],
+                    "route": route["route"],
+                    "baseline_p95_ms": before["p95_ms"],
+                    "p95_ms": route["p95_ms"],
+                })
+    return regressions
+
+
+def print_summary(result):
+    print(f"{'catalog':>8}  {'route':<30}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for size in result["results"]:
+        for route in size["routes"]:
+            print(
+                f"{size['catalog_size']:>8}  {route['route']:<30}{route['throughput_rps']:>9.1f}"
+                f"{route['p50_ms']:>9.2f}{route['p95_ms']:>9.2f}{route['p99_ms']:>9.2f}{route['errors']:>8}"
+            )
+    for regression in result.get("regressions", []):
+        print(f"REGRESSION {regression['catalog_size']} {regression['route']}: "
+              f"p95 {regression['baseline_p95_ms']:.2f} -> {regression['p95_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="seed,10000,100000", help="comma separated catalog sizes ('seed' = seeded set)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and size")
+    parser.add_argument("--concurrency", type=int, default=1, help="client threads")
+    parser.add_argument("--users", type=int, default=20, help="distinct users (tokens)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier --output file to compare p95 latency against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 increase counted as a regression")
+    args = parser.parse_args()
+
+    jwks_url, private_pem = start_jwks_server()
+    os.environ.update({
+        "STORAGE_BACKEND": "memory",
+        "COGNITO_REGION": REGION,
+        "USER_POOL_ID": USER_POOL_ID,
+        "CLIENT_ID": CLIENT_ID,
+        "JWKS_URL": jwks_url,
+    })
+    # Let the largest catalogs fit in the admin catalog cache unless overridden
+    os.environ.setdefault("PROMPT_CACHE_MAX_ITEMS", "200000")
+    os.environ.setdefault("METRICS_LOG_REQUESTS", "false")
+    # Measures the routes themselves rather than the per-user rate limits
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "off")
+
+    from main import app
+
+    tokens = [sign_token(private_pem, f"bench-user-{n}") for n in range(args.users)]
+    result = {
+        "benchmark": "routes",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "results": [
+            benchmark_size(app, size, tokens, args.requests, args.concurrency)
+            for size in args.sizes.split(",")
+        ],
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["regressions"] = compare(result, json.load(f), args.threshold)
+        exit_code = 1 if result["regressions"] else 0
+
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
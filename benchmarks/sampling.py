@@ -0,0 +1,72 @@
+"""Prompt sampling benchmark.
+
+Compares drawing a session's prompts with sampling.sample_prompts against the
+old approach (concatenate every prompt, shuffle, slice) for catalogs of 100
+to 100k prompts. Run from the repository root:
+
+    python benchmarks/sampling.py --output sampling.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import PromptCatalog
+from sampling import sample_prompts
+
+
+LEVELS = ["ice", "confess", "deep"]
+SIZES = [100, 1_000, 10_000, 100_000]
+SESSION_SIZE = 10
+
+
+def build_catalog(size):
+    prompts = [
+        {"prompt_id": str(n), "text": f"Prompt {n}", "level": LEVELS[n % len(LEVELS)], "user_id": "ADMIN"}
+        for n in range(size)
+    ]
+    return PromptCatalog(lambda: prompts, ttl=3600, max_items=size)
+
+
+def shuffle_and_slice(admin_prompts, user_prompts):
+    all_prompts = admin_prompts + user_prompts
+    random.shuffle(all_prompts)
+    return all_prompts[:SESSION_SIZE]
+
+
+def time_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200, help="calls per timing sample")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for size in SIZES:
+        catalog = build_catalog(size)
+        level_prompts = catalog.get("deep")
+        user_prompts = []
+
+        results.append({
+            "catalog_size": size,
+            "level_size": len(level_prompts),
+            "sample_us": time_us(lambda: sample_prompts([level_prompts, user_prompts], SESSION_SIZE), args.number),
+            "shuffle_us": time_us(lambda: shuffle_and_slice(level_prompts, user_prompts), max(1, args.number // 20)),
+        })
+
+    result = {"benchmark": "sampling", "session_size": SESSION_SIZE, "results": results}
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
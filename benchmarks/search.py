@@ -0,0 +1,89 @@
+"""Prompt search benchmark.
+
+Builds search.SearchIndex over generated catalogs of 1k to 100k prompts and
+times index builds, single-prompt updates and ranked queries (exact words,
+prefixes, several words, with and without a level filter). Run from the
+repository root:
+
+    python benchmarks/search.py --output search.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex, search
+
+
+LEVELS = ["ice", "confess", "deep"]
+SIZES = [1_000, 10_000, 100_000]
+VOCABULARY_SIZE = 20_000
+WORDS_PER_PROMPT = 10
+QUERIES = {
+    "word": ("w1234", None),
+    "prefix": ("w12", None),
+    "two_words": ("w1234 w77", None),
+    "level": ("w1234", "deep"),
+    "common_word": ("w1", None),
+    "prefix_level": ("w12", "ice"),
+}
+
+
+# Word frequencies follow a Zipf-like curve so some words are common and most are rare
+def build_prompts(size, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    words = [f"w{rank}" for rank in range(VOCABULARY_SIZE)]
+    return [
+        {
+            "prompt_id": f"{n:08d}",
+            "text": " ".join(rng.choices(words, weights, k=WORDS_PER_PROMPT)) + "?",
+            "level": LEVELS[n % len(LEVELS)],
+        }
+        for n in range(size)
+    ]
+
+
+def time_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200, help="calls per timing sample")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for size in SIZES:
+        prompts = build_prompts(size)
+        started = time.perf_counter()
+        index = SearchIndex(prompts)
+        result = {"prompts": size, "build_ms": (time.perf_counter() - started) * 1000}
+
+        extra = {"prompt_id": "extra", "text": "w1234 w5 w99999 brand new words?", "level": "ice"}
+        result["add_remove_us"] = time_us(lambda: (index.add(extra), index.remove("extra")), args.number)
+
+        for name, (query, level) in QUERIES.items():
+            result[f"{name}_us"] = time_us(lambda: search([index], query, level, limit=20), args.number)
+            result[f"{name}_matches"] = search([index], query, level, limit=20)[1]
+
+        results.append(result)
+
+    timing_keys = ["build_ms", "add_remove_us"] + [f"{name}_us" for name in QUERIES]
+    print(f"{'prompts':>8}" + "".join(f"{key:>16}" for key in timing_keys))
+    for result in results:
+        print(f"{result['prompts']:>8}" + "".join(f"{result[key]:>16.1f}" for key in timing_keys))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "search", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
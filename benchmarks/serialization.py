@@ -0,0 +1,88 @@
+"""JSON serialization and compression benchmark.
+
+Times encoding prompt lists of 1k to 100k prompts (as returned by DynamoDB,
+with Decimal numbers) with each JSON provider in encoding.py, then gzip and,
+if installed, brotli compression of the encoded body. Run from the
+repository root:
+
+    python benchmarks/serialization.py --output serialization.json
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+import compression
+from encoding import JSON_PROVIDERS, get_json_provider
+
+
+LEVELS = ["ice", "confess", "deep"]
+SIZES = [1_000, 10_000, 100_000]
+
+
+def build_prompts(size):
+    return [
+        {
+            "prompt_id": f"{n:08d}-0000-4000-8000-000000000000",
+            "text": f"Prompt {n}: what is something you have changed your mind about recently?",
+            "level": LEVELS[n % len(LEVELS)] if n % 2 else Decimal(n % 3 + 1),
+            "user_id": "ADMIN",
+            "public": True,
+        }
+        for n in range(size)
+    ]
+
+
+def time_ms(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=5, help="calls per timing sample")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {
+        name: get_json_provider(name)(app)
+        for name in JSON_PROVIDERS if get_json_provider(name) is JSON_PROVIDERS[name]
+    }
+    encodings = ["gzip"] + (["br"] if compression.brotli is not None else [])
+
+    results = []
+    with app.test_request_context():
+        for size in SIZES:
+            prompts = build_prompts(size)
+            result = {"prompts": size}
+
+            for name, provider in providers.items():
+                result[f"{name}_ms"] = time_ms(lambda: provider.response(prompts).get_data(), args.number)
+
+            body = providers["stdlib"].response(prompts).get_data()
+            result["body_bytes"] = len(body)
+            for encoding in encodings:
+                result[f"{encoding}_ms"] = time_ms(lambda: compression.compress(body, encoding), args.number)
+                result[f"{encoding}_bytes"] = len(compression.compress(body, encoding))
+
+            results.append(result)
+
+    print(f"{'prompts':>8}" + "".join(f"{key:>14}" for key in results[0] if key != "prompts"))
+    for result in results:
+        print(f"{result['prompts']:>8}" + "".join(
+            f"{value:>14.2f}" if isinstance(value, float) else f"{value:>14}"
+            for key, value in result.items() if key != "prompts"
+        ))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "serialization", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from collections import namedtuple
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+import uuid
+
+
+# NORMALIZE LEVEL
+# Levels are matched case-insensitively and may be stored as numbers (e.g. 1)
+def normalize_level(level):
+    return str(level).strip().lower()
+
+
+# Partition key of the UserLevelIndex GSI: one partition per (owner, level)
+def user_level_key(user_id, level):
+    return f"{user_id}#{normalize_level(level)}"
+
+
+# Prompt IDs derived from owner, level and text, so writing the same prompt
+# again (re-seeding, re-importing a deck) maps to the same item
+PROMPT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "connectionsapi/prompts")
+
+
+def content_prompt_id(user_id, level, text):
+    return str(uuid.uuid5(PROMPT_NAMESPACE, f"{user_id}\0{normalize_level(level)}\0{text.strip()}"))
+
+
+# PROMPT FINGERPRINTS
+# Prompts that differ only in case, whitespace or punctuation are the same
+# prompt. The fingerprint (owner, level and a hash of the folded text) is
+# stored on each prompt and keyed by the FingerprintIndex GSI, so a duplicate
+# check is one lookup.
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    # Apostrophes join their word ("what's" == "whats"); other punctuation separates words
+    text = re.sub(r"['\u2019]", "", text)
+    return " ".join(re.findall(r"[^\W_]+", text))
+
+
+def prompt_fingerprint(user_id, level, text):
+    digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()[:32]
+    return f"{user_level_key(user_id, level)}#{digest}"
+
+
+# One loaded catalog: the prompts, indexes by level and by ID, and a content
+# hash that stays the same across processes serving the same prompts
+class CatalogEntry(namedtuple("CatalogEntry", ["prompts", "by_level", "by_id", "version"])):
+    def at_level(self, level=None):
+        if level is None:
+            return self.prompts
+        return self.by_level.get(normalize_level(level), [])
+
+
+# PROMPT CATALOG CACHE
+# Keeps a process-level copy of a prompt set (the ADMIN catalog) so hot read
+# paths don't hit the UserIndex GSI on every request. Prompts are also indexed
+# by level so filtered reads only touch the prompts they return.
+class PromptCatalog:
+    def __init__(self, loader, ttl, max_items):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_items = max_items
+
+        self._lock = threading.Lock()
+        self._entry = None  # CatalogEntry
+        self._loaded_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _build_entry(prompts):
+        by_level = {}
+        by_id = {}
+        for prompt in prompts:
+            by_level.setdefault(normalize_level(prompt.get("level")), []).append(prompt)
+            by_id[prompt["prompt_id"]] = prompt
+
+        digest = hashlib.sha256()
+        for prompt_id in sorted(by_id):
+            prompt = by_id[prompt_id]
+            digest.update(f"{prompt_id}\0{prompt.get('text')}\0{prompt.get('level')}\0".encode())
+        return CatalogEntry(prompts, by_level, by_id, digest.hexdigest())
+
+    # Returns the cached entry if it hasn't expired, otherwise None
+    def _fresh(self):
+        entry = self._entry
+        if entry is not None and (time.monotonic() - self._loaded_at) < self.ttl:
+            return entry
+        return None
+
+    def _load(self):
+        entry = self._fresh()
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            entry = self._fresh()
+            if entry is not None:
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            entry = self._build_entry(self.loader())
+
+            # Too large to hold in memory: serve it uncached
+            if len(entry.prompts) > self.max_items:
+                self._entry = None
+                return entry
+
+            self._entry = entry
+            self._loaded_at = time.monotonic()
+            return entry
+
+    def is_fresh(self):
+        return self._fresh() is not None
+
+    # Returns the cached prompts (optionally only those at one level), reloading
+    # them when expired or invalidated. The returned list is shared between
+    # callers and must not be mutated.
+    def get(self, level=None):
+        return self._load().at_level(level)
+
+    def get_by_id(self, prompt_id):
+        return self._load().by_id.get(prompt_id)
+
+    # The current CatalogEntry, loaded once so a request can read its
+    # prompts, by_id and version consistently (and, when the catalog is too
+    # large to cache, without querying it again for each)
+    def snapshot(self):
+        return self._load()
+
+    # Content hash of the current catalog, used in ETags
+    def version(self):
+        return self._load().version
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+            self.invalidations += 1
+
+    def stats(self):
+        entry = self._entry
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": len(entry.prompts) if entry is not None else 0,
+            "levels": len(entry.by_level) if entry is not None else 0,
+            "ttl": self.ttl,
+            "max_items": self.max_items,
+        }
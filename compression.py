@@ -0,0 +1,90 @@
+from flask import request
+import zlib
+from metrics import timed
+from config import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # optional, only gzip is offered without it
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json", "application/x-ndjson", "text/html", "text/plain", "text/css", "application/javascript"
+}
+
+
+# Best encoding the client accepts, preferring brotli on equal quality
+def choose_encoding():
+    accepted = request.accept_encodings
+    options = (["br"] if brotli is not None else []) + ["gzip"]
+    encoding = max(options, key=lambda option: accepted[option])
+    return encoding if accepted[encoding] else None
+
+
+def gzip_compressor():
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = gzip_compressor()
+    return compressor.compress(data) + compressor.flush()
+
+
+# Compresses chunks of a streamed body as they are produced
+def compress_stream(chunks, encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            output = compressor.process(chunk)
+            if output:
+                yield output
+        yield compressor.finish()
+        return
+
+    compressor = gzip_compressor()
+    for chunk in chunks:
+        output = compressor.compress(chunk)
+        if output:
+            yield output
+    yield compressor.flush()
+
+
+# COMPRESS RESPONSES
+# Registered with app.after_request in main.py. Bodies smaller than
+# COMPRESSION_MIN_SIZE are sent as is; streamed bodies (whose size isn't
+# known up front) are always compressed when the client accepts it.
+def compress_response(response):
+    response.vary.add("Accept-Encoding")
+
+    if (
+        response.status_code < 200 or response.status_code in (204, 304)
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        with timed("compress"):
+            response.set_data(compress(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding
+
+    # The compressed body is a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
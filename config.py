@@ -1,7 +1,5 @@
 import os
 from dotenv import load_dotenv
-import requests
-import boto3
 
 load_dotenv()
 
@@ -9,15 +7,80 @@ REGION = os.getenv("COGNITO_REGION")
 USER_POOL_ID = os.getenv("USER_POOL_ID")
 CLIENT_ID = os.getenv("CLIENT_ID")
 
+# Owner of the seeded, shared prompt catalog
+ADMIN_USER_ID = "ADMIN"
 
-# Load public keys to verify tokens
-try:
-    JWKS_URL = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}/.well-known/jwks.json"
-    JWKS = requests.get(JWKS_URL).json()["keys"]
-except Exception as e:
-    JWKS = []
-    print("Failed to fetch JWKS:", e)
+# Admin prompt catalog cache (seconds / max prompts held in memory)
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "300"))
+PROMPT_CACHE_MAX_ITEMS = int(os.getenv("PROMPT_CACHE_MAX_ITEMS", "10000"))
 
+# Users whose prompt search index is kept in memory (see search.py)
+SEARCH_MAX_USERS = int(os.getenv("SEARCH_MAX_USERS", "1000"))
 
-# Cognito SDK client
-cognito_client = boto3.client('cognito-idp', region_name=REGION)
+# Recently verified JWTs kept in memory to skip repeat signature checks
+TOKEN_CACHE_MAX_ITEMS = int(os.getenv("TOKEN_CACHE_MAX_ITEMS", "1024"))
+
+
+# Public keys to verify tokens, fetched lazily on first use (see jwks.py)
+JWKS_URL = os.getenv("JWKS_URL") or f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}/.well-known/jwks.json"
+JWKS_TIMEOUT = float(os.getenv("JWKS_TIMEOUT", "3"))
+JWKS_REFRESH_INTERVAL = int(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))
+JWKS_MIN_REFETCH_INTERVAL = int(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))
+
+# Token refresh (see auth.py): results reused for concurrent refreshes, and
+# Cognito calls allowed per refresh token per window
+REFRESH_REUSE_SECONDS = int(os.getenv("REFRESH_REUSE_SECONDS", "10"))
+REFRESH_RATE_LIMIT = int(os.getenv("REFRESH_RATE_LIMIT", "5"))
+REFRESH_RATE_WINDOW = int(os.getenv("REFRESH_RATE_WINDOW", "300"))
+
+# Per-user, per-route token buckets (see ratelimit.py): "memory" (per worker),
+# "sqlite" (shared by the workers on a host, in RATE_LIMIT_SQLITE_PATH) or "off".
+# Rates are tokens per second, bursts the bucket sizes.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "ratelimit.db")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_READ_RATE = float(os.getenv("RATE_LIMIT_READ_RATE", "5"))
+RATE_LIMIT_READ_BURST = float(os.getenv("RATE_LIMIT_READ_BURST", "20"))
+RATE_LIMIT_WRITE_RATE = float(os.getenv("RATE_LIMIT_WRITE_RATE", "1"))
+RATE_LIMIT_WRITE_BURST = float(os.getenv("RATE_LIMIT_WRITE_BURST", "10"))
+
+# Storage backend: "dynamodb", "memory" (per process) or "sqlite" (file at SQLITE_PATH)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "dynamodb")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "connections.db")
+
+# Prompt seeding (see seed_prompts.py): prompts per batch write, batches in parallel
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "25"))
+SEED_WORKERS = int(os.getenv("SEED_WORKERS", "4"))
+
+# Sessions expire SESSION_TTL_DAYS after creation (0 keeps them forever) and
+# are removed by DynamoDB's TTL; archive_sessions.py moves sessions older than
+# SESSION_ARCHIVE_AFTER_DAYS to gzipped NDJSON files in ARCHIVE_DIR first.
+# That defaults to the TTL so sessions that can still be answered are kept.
+SESSION_TTL_DAYS = int(os.getenv("SESSION_TTL_DAYS", "90"))
+SESSION_ARCHIVE_AFTER_DAYS = int(os.getenv("SESSION_ARCHIVE_AFTER_DAYS", str(SESSION_TTL_DAYS or 90)))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_SCAN_SEGMENTS = int(os.getenv("ARCHIVE_SCAN_SEGMENTS", "4"))
+
+# Shared thread pool for concurrent storage reads (see fanout.py)
+FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "16"))
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "10"))
+
+# JSON encoder for responses: "orjson" (falls back to "stdlib" if not installed) or "stdlib"
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "orjson")
+
+# Response compression, negotiated with Accept-Encoding (see compression.py)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Log one structured line with timings per request
+METRICS_LOG_REQUESTS = os.getenv("METRICS_LOG_REQUESTS", "true").lower() == "true"
+# Shared secret GET /metrics/ requires in X-Metrics-Token; unset disables the endpoint
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Shared AWS client settings (see aws.py)
+BOTO_MAX_POOL_CONNECTIONS = int(os.getenv("BOTO_MAX_POOL_CONNECTIONS", "50"))
+BOTO_CONNECT_TIMEOUT = float(os.getenv("BOTO_CONNECT_TIMEOUT", "2"))
+BOTO_READ_TIMEOUT = float(os.getenv("BOTO_READ_TIMEOUT", "5"))
+BOTO_RETRY_MODE = os.getenv("BOTO_RETRY_MODE", "standard")
+BOTO_MAX_ATTEMPTS = int(os.getenv("BOTO_MAX_ATTEMPTS", "3"))
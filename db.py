@@ -1,10 +1,6 @@
-import boto3
-import os
-from config import REGION
+from storage import open_table
 
-# CREATE DB
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
-
-users_table = dynamodb.Table('Users')
-prompts_table = dynamodb.Table('Prompts')
-sessions_table = dynamodb.Table('Sessions')
+# DB TABLES (DynamoDB, in-memory or SQLite depending on STORAGE_BACKEND)
+users_table = open_table('users')
+prompts_table = open_table('prompts')
+sessions_table = open_table('sessions')
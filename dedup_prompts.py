@@ -0,0 +1,69 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from db import prompts_table
+from catalog import prompt_fingerprint
+from prompts import prompts_changed, prompt_tombstone, is_tombstone
+from config import ARCHIVE_SCAN_SEGMENTS
+
+
+SCAN_PAGE_SIZE = 500
+
+
+# PROMPT DEDUPLICATION
+# Scans the Prompts table (segments in parallel) and groups prompts by
+# fingerprint: same owner, level and text once case, whitespace and
+# punctuation are folded. The first prompt of each group (one already
+# fingerprinted, else the lowest ID) is kept and fingerprinted if needed.
+# The others become tombstones (see prompts.prompt_tombstone) recording the
+# prompt they were merged into.
+def scan_segment(segment, total_segments):
+    groups = {}
+    for item in prompts_table.iter_scan(segment, total_segments, SCAN_PAGE_SIZE):
+        if is_tombstone(item):
+            continue
+        fingerprint = prompt_fingerprint(item["user_id"], item.get("level"), item.get("text", ""))
+        groups.setdefault(fingerprint, []).append(item)
+    return groups
+
+
+def dedup_prompts(segments=ARCHIVE_SCAN_SEGMENTS, dry_run=False):
+    groups = {}
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        for segment_groups in executor.map(lambda segment: scan_segment(segment, segments), range(segments)):
+            for fingerprint, items in segment_groups.items():
+                groups.setdefault(fingerprint, []).extend(items)
+
+    writes = []
+    merged = 0
+    fingerprinted = 0
+    owners = set()
+    for fingerprint, items in groups.items():
+        items.sort(key=lambda item: (item.get("fingerprint") != fingerprint, item["prompt_id"]))
+        keeper, duplicates = items[0], items[1:]
+
+        if keeper.get("fingerprint") != fingerprint:
+            writes.append(dict(keeper, fingerprint=fingerprint))
+            fingerprinted += 1
+        for item in duplicates:
+            writes.append(prompt_tombstone(item, merged_into=keeper["prompt_id"]))
+        if duplicates:
+            merged += len(duplicates)
+            owners.add(keeper["user_id"])
+
+    if not dry_run:
+        prompts_table.batch_put(writes)
+        for user_id in owners:
+            prompts_changed(user_id)
+
+    action = "Would merge" if dry_run else "Merged"
+    print(f"{action} {merged} duplicate prompts from {len(owners)} owners; {fingerprinted} prompts fingerprinted.")
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge prompts whose normalized text is the same.")
+    parser.add_argument("--segments", type=int, default=ARCHIVE_SCAN_SEGMENTS)
+    parser.add_argument("--dry-run", action="store_true", help="count the duplicates without writing")
+    args = parser.parse_args()
+
+    dedup_prompts(args.segments, dry_run=args.dry_run)
@@ -0,0 +1,75 @@
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+import json
+from metrics import timed
+from config import JSON_PROVIDER
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib provider is used without it
+    orjson = None
+
+
+# DynamoDB returns every number as a Decimal; whole numbers (e.g. a numeric
+# level) go out as JSON integers, anything else as floats.
+def encode_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# STDLIB PROVIDER
+# Flask's provider with Decimal support. JSON encoding time shows up as "json".
+class StdlibJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, (Decimal, set, frozenset)):
+            return encode_default(obj)
+        return DefaultJSONProvider.default(obj)
+
+    def dumps(self, obj, **kwargs):
+        with timed("json"):
+            return super().dumps(obj, **kwargs)
+
+
+# ORJSON PROVIDER
+# Encodes straight to bytes several times faster than the stdlib encoder.
+# Responses are built from those bytes without decoding them to str first.
+class OrjsonJSONProvider(DefaultJSONProvider):
+    def dumps_bytes(self, obj):
+        with timed("json"):
+            return orjson.dumps(obj, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return json.dumps(obj, default=encode_default, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+JSON_PROVIDERS = {
+    "stdlib": StdlibJSONProvider,
+    "orjson": OrjsonJSONProvider,
+}
+
+
+# Provider class named by JSON_PROVIDER, falling back to the stdlib encoder
+# when orjson isn't installed
+def get_json_provider(name=JSON_PROVIDER):
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON provider: {name}")
+    if name == "orjson" and orjson is None:
+        return StdlibJSONProvider
+    return JSON_PROVIDERS[name]
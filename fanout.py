@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from config import FANOUT_MAX_WORKERS, FANOUT_TIMEOUT
+
+
+# FAN-OUT POOL
+# Shared, bounded pool for running independent storage reads at the same
+# time. Work runs in a copy of the caller's context, so Flask's request
+# context (and the request's timings on flask.g) are visible in the worker.
+executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+END = object()
+
+
+def submit(fn, *args):
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+# Runs every call concurrently and returns their results in order. Raises the
+# first error, or concurrent.futures.TimeoutError if a call exceeds the timeout.
+def run_concurrently(*calls, timeout=FANOUT_TIMEOUT):
+    futures = [submit(call) for call in calls]
+    return [future.result(timeout=timeout) for future in futures]
+
+
+# Iterates `iterator` (e.g. query pages) while fetching the next item in the
+# background, so each page is read while the previous one is being used. The
+# first fetch starts immediately.
+def prefetch(iterator, timeout=FANOUT_TIMEOUT):
+    future = submit(next, iterator, END)
+
+    def generate():
+        nonlocal future
+        while True:
+            item = future.result(timeout=timeout)
+            if item is END:
+                return
+            future = submit(next, iterator, END)
+            yield item
+
+    return generate()
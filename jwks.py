@@ -0,0 +1,75 @@
+import threading
+import time
+import requests
+from jose import jwk
+
+
+# JWKS KEY STORE
+# Loads Cognito's public keys on first use instead of at import time, indexes
+# them by kid and keeps the parsed key objects. Unknown kids (e.g. after a key
+# rotation) trigger a rate-limited refetch, and keys older than the refresh
+# interval are refreshed in the background while the old ones keep serving.
+class KeyStore:
+    def __init__(self, url, timeout, refresh_interval, min_refetch_interval):
+        self.url = url
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+
+        self._lock = threading.Lock()
+        self._keys = None  # kid -> parsed jose Key
+        self._fetched_at = 0.0
+        self._last_attempt = None
+        self._refreshing = False
+
+    def _fetch(self):
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+
+        keys = {}
+        for key_data in response.json()["keys"]:
+            keys[key_data["kid"]] = jwk.construct(key_data, key_data.get("alg", "RS256"))
+        return keys
+
+    # Fetches the key set unless another fetch happened too recently.
+    # Must be called with the lock held.
+    def _refetch_locked(self):
+        now = time.monotonic()
+        if self._last_attempt is not None and now - self._last_attempt < self.min_refetch_interval:
+            return
+        self._last_attempt = now
+
+        try:
+            self._keys = self._fetch()
+            self._fetched_at = time.monotonic()
+        except Exception as e:
+            print("Failed to fetch JWKS:", e)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                with self._lock:
+                    self._refetch_locked()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    # Returns the parsed key for kid, or None if Cognito doesn't publish it
+    def get_key(self, kid):
+        keys = self._keys
+        if keys is not None and kid in keys:
+            if time.monotonic() - self._fetched_at > self.refresh_interval:
+                self._refresh_in_background()
+            return keys[kid]
+
+        with self._lock:
+            # Another thread may have loaded the key while we waited for the lock
+            if self._keys is None or kid not in self._keys:
+                self._refetch_locked()
+            return (self._keys or {}).get(kid)
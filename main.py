@@ -1,20 +1,45 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify
+from concurrent.futures import TimeoutError as FanoutTimeoutError
 from dotenv import load_dotenv
+import logging
 import os
 
 from auth import auth_bp
 from prompts import prompts_bp
 from sessions import sessions_bp
+from metrics import metrics_bp
+from encoding import get_json_provider
+from compression import compress_response
+from seed_prompts import seed_prompts_data
+from config import STORAGE_BACKEND
 
 
 load_dotenv()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "random-key")
+app.json = get_json_provider()(app)
 
 
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(prompts_bp, url_prefix='/prompts')
 app.register_blueprint(sessions_bp, url_prefix='/sessions')
+app.register_blueprint(metrics_bp, url_prefix='/metrics')
+
+# Registered after the blueprints so it runs before the metrics hook and its
+# time is included in Server-Timing
+app.after_request(compress_response)
+
+
+# The in-memory backend starts empty in every process
+if STORAGE_BACKEND == "memory":
+    seed_prompts_data()
+
+
+# A concurrent storage read ran past FANOUT_TIMEOUT
+@app.errorhandler(FanoutTimeoutError)
+def storage_timeout(error):
+    return jsonify({"error": "Storage request timed out"}), 504
 
 
 @app.route("/")
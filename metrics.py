@@ -0,0 +1,196 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import Blueprint, jsonify, g, request, has_request_context
+import hmac
+import json
+import logging
+import threading
+import time
+from config import METRICS_LOG_REQUESTS, METRICS_TOKEN
+
+
+metrics_bp = Blueprint("metrics", __name__)
+logger = logging.getLogger("connections.metrics")
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open ended
+BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+# HISTOGRAMS
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.capacity_units = 0.0
+
+    def observe(self, duration_ms, capacity_units=0.0):
+        index = 0
+        while index < len(BUCKETS_MS) and duration_ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.capacity_units += capacity_units
+
+    def to_dict(self):
+        buckets = {f"le_{bound}": count for bound, count in zip(BUCKETS_MS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "capacity_units": self.capacity_units,
+            "buckets": buckets,
+        }
+
+
+_lock = threading.Lock()
+# Operation being timed in this thread/context, for attributing consumed capacity
+_current_operation = ContextVar("current_operation", default=None)
+_route_histograms = {}
+_operation_histograms = {}
+
+
+def observe(histograms, name, duration_ms, capacity_units=0.0):
+    with _lock:
+        histograms.setdefault(name, Histogram()).observe(duration_ms, capacity_units)
+
+
+# PER-REQUEST TIMINGS
+# Operations timed during a request are kept on flask.g as
+# {name: {"count", "duration_ms", "capacity_units"}}. Timings may be added from
+# fan-out worker threads, so updates hold the lock. Outside a request
+# (scripts, background threads) timings are not recorded.
+def request_timings():
+    if not has_request_context():
+        return None
+    return g.setdefault("timings", {})
+
+
+def add_timing(timings, name, duration_ms=0.0, count=0, capacity_units=0.0):
+    with _lock:
+        timing = timings.setdefault(name, {"count": 0, "duration_ms": 0.0, "capacity_units": 0.0})
+        timing["count"] += count
+        timing["duration_ms"] += duration_ms
+        timing["capacity_units"] += capacity_units
+
+
+@contextmanager
+def timed(name):
+    token = _current_operation.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _current_operation.reset(token)
+        observe(_operation_histograms, name, duration_ms)
+
+        timings = request_timings()
+        if timings is not None:
+            add_timing(timings, name, duration_ms, count=1)
+
+
+# Adds DynamoDB ConsumedCapacity (a dict or list of dicts) to the operation
+# currently being timed
+def record_capacity(consumed):
+    timings = request_timings()
+    if timings is None or not consumed:
+        return
+
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    units = sum(entry.get("CapacityUnits", 0) for entry in consumed)
+    add_timing(timings, _current_operation.get() or "db", capacity_units=float(units))
+
+
+# Decorator timing a storage table method as db.<Table>.<method>
+def instrumented(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with timed(f"db.{self.name}.{method.__name__}"):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# --------------------
+# Request Hooks
+# --------------------
+
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def report_request_timings(response):
+    if "request_started" not in g:
+        return response
+
+    total_ms = (time.perf_counter() - g.request_started) * 1000
+    timings = g.get("timings", {})
+    capacity_units = sum(timing["capacity_units"] for timing in timings.values())
+
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}"
+    observe(_route_histograms, route, total_ms, capacity_units)
+
+    entries = []
+    for name, timing in timings.items():
+        entry = f'{name};dur={timing["duration_ms"]:.2f};desc="{timing["count"]} calls'
+        if timing["capacity_units"]:
+            entry += f', {timing["capacity_units"]:g} CU'
+        entries.append(entry + '"')
+    entries.append(f"total;dur={total_ms:.2f}")
+    response.headers["Server-Timing"] = ", ".join(entries)
+
+    if METRICS_LOG_REQUESTS:
+        logger.info(json.dumps({
+            "route": route,
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 3),
+            "capacity_units": capacity_units,
+            "operations": timings,
+        }))
+    return response
+
+
+# --------------------
+# Metrics Endpoint
+# --------------------
+
+
+# Only for callers holding METRICS_TOKEN (monitoring, operators): the
+# histograms and counters describe every user's traffic
+@metrics_bp.route("/", methods=["GET"])
+def get_metrics():
+    if not METRICS_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("X-Metrics-Token", "").encode(), METRICS_TOKEN.encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # Imported here to avoid a circular import (prompts/utils time their work through this module)
+    from prompts import admin_catalog, user_search_indexes
+    from utils import token_cache
+    from auth import refresh_coalescer
+    from ratelimit import rate_limit_stats
+
+    with _lock:
+        routes = {name: histogram.to_dict() for name, histogram in _route_histograms.items()}
+        operations = {name: histogram.to_dict() for name, histogram in _operation_histograms.items()}
+
+    return jsonify({
+        "routes": routes,
+        "operations": operations,
+        "caches": {
+            "admin_prompts": admin_catalog.stats(),
+            "verified_tokens": token_cache.stats(),
+            "search_indexes": user_search_indexes.stats(),
+        },
+        "token_refresh": refresh_coalescer.stats(),
+        "rate_limits": rate_limit_stats(),
+    }), 200
@@ -1,56 +1,408 @@
-from flask import Blueprint, request, jsonify
-from boto3.dynamodb.conditions import Key
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from itertools import chain
+from datetime import datetime
+import json
+import threading
 import uuid
-import random
-from utils import get_user_id_from_request, login_required
-from db import prompts_table
+from utils import (
+    get_user_id_from_request, login_required, encode_cursor, decode_cursor, stream_json_array,
+    make_etag, set_private_etag, not_modified_response
+)
+from ratelimit import rate_limited
+from db import prompts_table, users_table
+from catalog import PromptCatalog, user_level_key, content_prompt_id, prompt_fingerprint
+from sampling import choose_prompt
+from fanout import run_concurrently, prefetch
+from search import SearchIndex, SearchIndexCache, search, tokenize
+from config import ADMIN_USER_ID, PROMPT_CACHE_TTL, PROMPT_CACHE_MAX_ITEMS, SEARCH_MAX_USERS
 
 
 prompts_bp = Blueprint("prompts", __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+SEARCH_PAGE_SIZE = 20
+IMPORT_BATCH_SIZE = 100
+MAX_IMPORT_ERRORS = 100
+
 
 #GET SPECIFIC PROMPT
 def get_specific_prompt(prompt_id):
-    response = prompts_table.get_item(
-        Key={"prompt_id": prompt_id}
-    )
-
-    return response["Item"] #Will return None if not found
+    return prompts_table.get({"prompt_id": prompt_id}) #Will return None if not found
 
 
 # GET PROMPTS
-def get_all_admin_prompts():
-    response = prompts_table.query(
-        IndexName="UserIndex",
-        KeyConditionExpression=Key("user_id").eq("ADMIN")
-    )
-    return response["Items"]
+# Index attribute and value for one owner's prompts, optionally narrowed to one level
+def owner_query(user_id, level=None):
+    if level:
+        return "user_level", user_level_key(user_id, level)
+    return "user_id", user_id
+
+
+def iter_user_prompts(user_id, level=None):
+    attribute, value = owner_query(user_id, level)
+    return prompts_table.iter_query(attribute, value)
+
+
+def iter_user_prompt_pages(user_id, level=None):
+    attribute, value = owner_query(user_id, level)
+    return prompts_table.iter_pages(attribute, value)
+
+
+# Reads a single page of up to `limit` prompts, returns (items, last_key)
+def query_user_prompt_page(user_id, level, limit, start_key=None):
+    attribute, value = owner_query(user_id, level)
+    return prompts_table.query(attribute, value, limit, start_key)
+
+
+def query_admin_prompts():
+    return list(iter_user_prompts(ADMIN_USER_ID))
+
+
+# Admin prompts rarely change, so they are served from an in-process cache
+admin_catalog = PromptCatalog(query_admin_prompts, PROMPT_CACHE_TTL, PROMPT_CACHE_MAX_ITEMS)
+
+
+def get_all_admin_prompts(level=None):
+    return admin_catalog.get(level)
+
+
+def get_all_user_prompts(user_id, level=None):
+    return list(iter_user_prompts(user_id, level))
+
 
+# Loads the admin and the user's prompts at the same time. The admin catalog
+# is usually cached, in which case only the user query is made.
+def get_admin_and_user_prompts(user_id, level=None):
+    if admin_catalog.is_fresh():
+        return get_all_admin_prompts(level), get_all_user_prompts(user_id, level)
 
-def get_all_user_prompts(user_id):
-    response = prompts_table.query(
-        IndexName="UserIndex",
-        KeyConditionExpression=Key("user_id").eq(user_id)
+    admin_prompts, user_prompts = run_concurrently(
+        lambda: get_all_admin_prompts(level),
+        lambda: get_all_user_prompts(user_id, level)
     )
-    return response["Items"]
+    return admin_prompts, user_prompts
+
+
+# Returns one page of admin prompts followed by the user's own prompts.
+# The cursor records which source to resume from: an offset into the cached
+# admin catalog, then the last key of the user's previous page. `catalog` is
+# the admin CatalogEntry to page through, if already loaded.
+def get_prompt_page(user_id, level, limit, cursor=None, catalog=None):
+    position = cursor or {"source": "admin", "offset": 0}
+    page = []
+
+    if position["source"] == "admin":
+        admin_prompts = (catalog or admin_catalog.snapshot()).at_level(level)
+        offset = position["offset"]
+        page = admin_prompts[offset:offset + limit]
+
+        if offset + limit < len(admin_prompts):
+            return page, {"source": "admin", "offset": offset + limit}
+        position = {"source": "user", "key": None}
+
+    remaining = limit - len(page)
+    if remaining == 0:
+        return page, position
+
+    items, last_key = query_user_prompt_page(user_id, level, remaining, position.get("key"))
+    page.extend(items)
+
+    if last_key:
+        return page, {"source": "user", "key": last_key}
+    return page, None
+
+
+# Looks up prompts by ID: admin prompts come from the cached catalog, the rest
+# from one batch get. Returns {prompt_id: prompt}; IDs of deleted prompts are
+# left out.
+def get_prompts_by_ids(prompt_ids):
+    admin_by_id = admin_catalog.snapshot().by_id
+    found = {}
+    missing = []
+    for prompt_id in dict.fromkeys(prompt_ids):
+        prompt = admin_by_id.get(prompt_id)
+        if prompt is not None:
+            found[prompt_id] = prompt
+        else:
+            missing.append(prompt_id)
+
+    for prompt in prompts_table.batch_get([{"prompt_id": prompt_id} for prompt_id in missing]):
+        found[prompt["prompt_id"]] = prompt
+
+    return found
+
+
+# PROMPT VERSIONS
+# Each user's prompts_version (kept in the Users table) changes whenever they
+# add or delete a prompt; with the admin catalog's content hash it identifies
+# a prompt list for ETags without reading the prompts themselves.
+def get_user_prompts_version(user_id):
+    item = users_table.get({"user_id": user_id}, attributes=["prompts_version"])
+    return item.get("prompts_version", 0) if item else 0
+
+
+# Called after the prompt write, so a list read in between is tagged with the old version.
+# Returns the user's new prompts_version (None for the admin catalog).
+def prompts_changed(user_id):
+    if user_id == ADMIN_USER_ID:
+        admin_catalog.invalidate()
+        return None
+    return users_table.increment({"user_id": user_id}, "prompts_version")
+
+
+# SEARCH INDEXES
+# The admin catalog's index follows the cached catalog (only changed prompts
+# are re-indexed when it reloads); users' indexes are kept per user and
+# updated in place by create_prompt and delete_prompt_by_id.
+admin_search_index = SearchIndex()
+user_search_indexes = SearchIndexCache(get_all_user_prompts, SEARCH_MAX_USERS)
+
+
+def search_indexes_for(user_id):
+    catalog = admin_catalog.snapshot()
+    admin_search_index.sync(catalog.prompts, catalog.version)
+    if user_id == ADMIN_USER_ID:
+        return [admin_search_index]
+    return [admin_search_index, user_search_indexes.get(user_id, get_user_prompts_version(user_id))]
+
+
+def search_prompts(user_id, query, level=None, limit=SEARCH_PAGE_SIZE, offset=0):
+    return search(search_indexes_for(user_id), query, level, limit, offset)
+
+
+# DUPLICATE PROMPTS
+# ID of the user's prompt at `level` whose text matches `prompt_text` once
+# case, whitespace and punctuation are folded, or None. One FingerprintIndex lookup.
+def find_duplicate_prompt(prompt_text, level, user_id):
+    return find_prompt_by_fingerprint(prompt_fingerprint(user_id, level, prompt_text))
+
+
+def find_prompt_by_fingerprint(fingerprint):
+    items, _ = prompts_table.query("fingerprint", fingerprint, limit=1, attributes=["prompt_id"])
+    return items[0]["prompt_id"] if items else None
 
 
 # CREATE PROMPT
 def create_prompt(prompt_text, level, user_id):
     prompt_id = str(uuid.uuid4())
-    prompts_table.put_item(Item={
+    prompt = {
         'prompt_id': prompt_id, 
         'text': prompt_text,
         'level': level,
         'user_id': user_id,       
+        'user_level': user_level_key(user_id, level),
+        'fingerprint': prompt_fingerprint(user_id, level, prompt_text),
         'public': True
-    })
+    }
+    prompts_table.put(prompt)
+
+    version = prompts_changed(user_id)
+    user_search_indexes.prompt_added(user_id, prompt, version)
     return prompt_id
 
 
+# BULK WRITES
+# Prompt item with an ID derived from its content, for seeding and imports
+def content_prompt_item(prompt_text, level, user_id):
+    return {
+        'prompt_id': content_prompt_id(user_id, level, prompt_text),
+        'text': prompt_text.strip(),
+        'level': level,
+        'user_id': user_id,
+        'user_level': user_level_key(user_id, level),
+        'fingerprint': prompt_fingerprint(user_id, level, prompt_text),
+        'public': True
+    }
+
+
+# STORED FINGERPRINTS
+# Fingerprints of owners' stored prompts for bulk writes. Each owner's are
+# read once, with one paged query projected to the fingerprint (legacy
+# prompts without one are fingerprinted from their text and level), rather
+# than one FingerprintIndex lookup per prompt written. Tombstones have no
+# owner, so a deleted prompt can be written again. Safe to share between
+# the threads writing batches.
+class StoredFingerprints:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners = {}
+
+    def _load(self, user_id):
+        fingerprints = set()
+        start_key = None
+        while True:
+            items, start_key = prompts_table.query(
+                "user_id", user_id, start_key=start_key, attributes=["fingerprint", "text", "level"]
+            )
+            for item in items:
+                fingerprints.add(
+                    item.get("fingerprint") or prompt_fingerprint(user_id, item.get("level"), item.get("text", ""))
+                )
+            if not start_key:
+                return fingerprints
+
+    # True if no stored or earlier claimed prompt has the item's fingerprint;
+    # the fingerprint is then taken, so later repeats are turned away
+    def claim(self, item):
+        with self._lock:
+            fingerprints = self._owners.get(item["user_id"])
+            if fingerprints is None:
+                fingerprints = self._owners[item["user_id"]] = self._load(item["user_id"])
+            if item["fingerprint"] in fingerprints:
+                return False
+            fingerprints.add(item["fingerprint"])
+            return True
+
+
+# Writes the prompts (a {prompt_id: item} dict) whose fingerprint `stored`
+# (a StoredFingerprints) hasn't seen, skipping exact and near-duplicates of
+# stored prompts and of earlier items, and returns the items written.
+# Callers run prompts_changed() for the owners afterwards.
+def write_new_prompts(items, stored):
+    new_items = [item for item in items.values() if stored.claim(item)]
+    if new_items:
+        prompts_table.batch_put(new_items)
+    return new_items
+
+
+# Levels are stored as given: DynamoDB takes strings and integers but not
+# floats (boto3 refuses them), so 1.5 is rejected up front
+def is_valid_level(level):
+    if isinstance(level, bool):
+        return False
+    return isinstance(level, int) or isinstance(level, str) and level.strip() != ""
+
+
+# Checks the text and level of a new prompt; returns the error or None
+def prompt_error(prompt):
+    text = prompt.get("text")
+    if not isinstance(text, str) or not text.strip():
+        return "Missing text"
+    if not is_valid_level(prompt.get("level")):
+        return "Level must be a non-empty string or an integer"
+    return None
+
+
+# Parses one line of an NDJSON import; returns (prompt, None) or (None, error)
+def parse_import_line(line):
+    try:
+        prompt = json.loads(line)
+    except ValueError:
+        return None, "Invalid JSON"
+    if not isinstance(prompt, dict):
+        return None, "Expected a JSON object"
+
+    error = prompt_error(prompt)
+    if error:
+        return None, error
+    return prompt, None
+
+
+# IMPORT PROMPTS
+# Reads an NDJSON stream of {"text", "level"} objects a line at a time and
+# writes them IMPORT_BATCH_SIZE at a time, so memory use doesn't grow with
+# the deck. Prompts already stored (same owner, level and text) are skipped.
+# Returns the counts and up to MAX_IMPORT_ERRORS per-line errors.
+def import_prompts(lines, user_id):
+    imported = 0
+    existing = 0
+    failed = 0
+    errors = []
+    batch = {}
+    stored = StoredFingerprints()
+
+    def flush():
+        nonlocal imported, existing
+        written = len(write_new_prompts(batch, stored))
+        imported += written
+        existing += len(batch) - written
+        batch.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        prompt, error = parse_import_line(line)
+        if error:
+            failed += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line_number, "error": error})
+            continue
+
+        item = content_prompt_item(prompt["text"], prompt["level"], user_id)
+        if item["prompt_id"] in batch:
+            existing += 1
+        batch[item["prompt_id"]] = item
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+
+    if batch:
+        flush()
+    if imported:
+        prompts_changed(user_id)
+
+    return {"imported": imported, "existing": existing, "failed": failed, "errors": errors}
+
+
+# EXPORT PROMPTS
+# Streams the user's own prompts as NDJSON, one page of the query at a time
+# (the next page loads while the current one is sent)
+def export_prompts(user_id, level=None):
+    def generate():
+        for page in prefetch(iter_user_prompt_pages(user_id, level)):
+            if page:
+                yield "".join(
+                    current_app.json.dumps({
+                        "prompt_id": prompt["prompt_id"],
+                        "text": prompt["text"],
+                        "level": prompt["level"]
+                    }) + "\n"
+                    for prompt in page
+                )
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["Content-Disposition"] = "attachment; filename=prompts.ndjson"
+    return response
+
+
+# PROMPT TOMBSTONES
+# Sessions keep only prompt IDs, so a deleted or merged prompt is replaced by
+# a tombstone holding its text and level. Without user_id, user_level and
+# fingerprint it drops out of every index (lists, sampling, search and
+# duplicate checks) while sessions can still read it by ID.
+def prompt_tombstone(prompt, **marker):
+    return dict({
+        "prompt_id": prompt["prompt_id"],
+        "text": prompt.get("text"),
+        "level": prompt.get("level"),
+    }, **marker)
+
+
+def is_tombstone(prompt):
+    return "user_id" not in prompt
+
+
 # DELETE PROMPTS
-def delete_prompt_by_id(prompt_id):
-    prompts_table.delete_item(Key={'prompt_id': prompt_id})
+# One conditional update that only goes through if `user_id` owns the prompt:
+# dropping user_id, user_level and fingerprint turns it into a tombstone in
+# place (see prompt_tombstone). The prompt as it was tells a missing prompt
+# from someone else's. Returns "deleted", "missing" or "forbidden".
+def delete_prompt_by_id(prompt_id, user_id):
+    old_prompt = prompts_table.update_if(
+        {'prompt_id': prompt_id},
+        assignments=[(("deleted_at",), datetime.utcnow().isoformat() + "Z")],
+        removals=["user_id", "user_level", "fingerprint"],
+        expected=[(("user_id",), user_id)]
+    )
+    if not old_prompt or is_tombstone(old_prompt):
+        return "missing"
+    if old_prompt.get("user_id") != user_id:
+        return "forbidden"
+
+    version = prompts_changed(user_id)
+    user_search_indexes.prompt_removed(user_id, prompt_id, version)
+    return "deleted"
 
 
 # --------------------
@@ -58,29 +410,77 @@ def delete_prompt_by_id(prompt_id):
 # --------------------
 
 
-# Obtains either all prompts or filters prompts to obtain all prompts of the same level
+# A user page key must be one this user's query (with the same level) could
+# have returned: the prompt's ID plus the index key it was read through
+def is_valid_prompt_cursor(cursor, user_id, level=None):
+    if cursor.get("source") == "admin":
+        offset = cursor.get("offset")
+        return isinstance(offset, int) and not isinstance(offset, bool) and offset >= 0
+    if cursor.get("source") == "user":
+        key = cursor.get("key")
+        if key is None:
+            return True
+        attribute, value = owner_query(user_id, level)
+        return (
+            isinstance(key, dict) and set(key) == {"prompt_id", attribute}
+            and isinstance(key["prompt_id"], str) and key[attribute] == value
+        )
+    return False
+
+
+# Obtains either all prompts or filters prompts to obtain all prompts of the same level.
+# With ?limit=N the prompts are returned a page at a time along with a next_cursor.
+# Answers If-None-Match with a 304 using only the catalog and user versions.
 @prompts_bp.route("/", methods=["GET"])
 @login_required
+@rate_limited("read")
 def get_all_prompts():
     user_id = get_user_id_from_request()
+    level = request.args.get("level")
 
-    admin_prompts = get_all_admin_prompts()
-    user_prompts = get_all_user_prompts(user_id)
-    all_prompts = admin_prompts + user_prompts
-
-    if request.args.get("level"):
-        filtered_prompts = []
-        for prompt in all_prompts:
-            if prompt["level"].lower() == request.args.get("level").lower():
-                filtered_prompts.append(prompt)
-        return jsonify(filtered_prompts), 200
-    else:
-        return jsonify(all_prompts), 200
+    # The ETag and the body come from the same catalog entry
+    catalog = admin_catalog.snapshot()
+    etag = make_etag(
+        "prompts", user_id, catalog.version, get_user_prompts_version(user_id),
+        level, request.args.get("limit"), request.args.get("cursor")
+    )
+    cached = not_modified_response(etag)
+    if cached:
+        return cached
+
+    if "limit" not in request.args and "cursor" not in request.args:
+        # The user's first page loads while the admin prompts are encoded, and
+        # each later page while the previous one is being streamed
+        user_pages = prefetch(iter_user_prompt_pages(user_id, level))
+        prompts = chain(catalog.at_level(level), chain.from_iterable(user_pages))
+        response = stream_json_array(prompts)
+        set_private_etag(response, etag)
+        return response, 200
+
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        if cursor is not None and not is_valid_prompt_cursor(cursor, user_id, level):
+            raise ValueError("Invalid cursor")
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    page, next_position = get_prompt_page(user_id, level, limit, cursor, catalog)
+    response = jsonify({
+        "prompts": page,
+        "next_cursor": encode_cursor(next_position) if next_position else None
+    })
+    set_private_etag(response, etag)
+    return response, 200
 
 
 # Obtains a specific prompt from a specific level
 @prompts_bp.route("/random", methods=["GET"])
 @login_required
+@rate_limited("read")
 def get_random_prompt():
     level = request.args.get("level")
     #First check if level is provided, otherwise provide error
@@ -89,17 +489,11 @@ def get_random_prompt():
 
     user_id = get_user_id_from_request()
 
-    admin_prompts = get_all_admin_prompts()
-    user_prompts = get_all_user_prompts(user_id)
-    all_prompts = admin_prompts + user_prompts
-
-    filtered_prompts = []
+    admin_prompts, user_prompts = get_admin_and_user_prompts(user_id, level)
 
-    for prompt in all_prompts:
-            if prompt["level"].lower() == level.lower():
-                filtered_prompts.append(prompt)
-
-    prompt = random.choice(filtered_prompts)
+    prompt = choose_prompt([admin_prompts, user_prompts])
+    if prompt is None:
+        return jsonify({"error": f"No prompts found for level {level}"}), 404
 
     return jsonify(prompt), 200
 
@@ -107,34 +501,93 @@ def get_random_prompt():
 # Add a prompt
 @prompts_bp.route("/", methods=["POST"])
 @login_required
+@rate_limited("write")
 def add_prompt():
     data = request.json
-    if "text" not in data or "level" not in data:
+    if not isinstance(data, dict) or "text" not in data or "level" not in data:
         return jsonify({"error": "Missing text or level"}), 400
+    error = prompt_error(data)
+    if error:
+        return jsonify({"error": error}), 400
 
     user_id = get_user_id_from_request()
 
     text = data.get("text")
     level = data.get("level")
 
+    duplicate_id = find_duplicate_prompt(text, level, user_id)
+    if duplicate_id:
+        return jsonify({"error": "You already have this prompt", "prompt_id": duplicate_id}), 409
+
     prompt_id = create_prompt(text, level, user_id)
     return jsonify({"prompt_id": prompt_id}), 201
 
 
+# Ranked search over the admin prompts and the user's own: ?q=words (the
+# last ones may be partial), optional ?level, ?limit and ?cursor as for GET /
+@prompts_bp.route("/search", methods=["GET"])
+@login_required
+@rate_limited("read")
+def search_prompt_catalog():
+    query = request.args.get("q", "")
+    if not tokenize(query):
+        return jsonify({"error": "Missing or unsearchable q query parameter"}), 400
+
+    try:
+        limit = int(request.args.get("limit", SEARCH_PAGE_SIZE))
+        cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else {"offset": 0}
+        offset = cursor.get("offset")
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid cursor")
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    user_id = get_user_id_from_request()
+    results, total = search_prompts(user_id, query, request.args.get("level"), limit, offset)
+    next_offset = offset + len(results)
+    return jsonify({
+        "prompts": results,
+        "total": total,
+        "next_cursor": encode_cursor({"offset": next_offset}) if next_offset < total else None
+    }), 200
+
+
+# Import prompts from an NDJSON body ({"text": ..., "level": ...} per line)
+@prompts_bp.route("/import", methods=["POST"])
+@login_required
+@rate_limited("write")
+def import_prompt_deck():
+    user_id = get_user_id_from_request()
+    result = import_prompts(request.stream, user_id)
+    if result["failed"] and not (result["imported"] or result["existing"]):
+        return jsonify(result), 400
+    return jsonify(result), 200
+
+
+# Export the user's own prompts as NDJSON (optional ?level filter)
+@prompts_bp.route("/export", methods=["GET"])
+@login_required
+@rate_limited("read")
+def export_prompt_deck():
+    user_id = get_user_id_from_request()
+    return export_prompts(user_id, request.args.get("level")), 200
+
+
 # Delete prompt by ID from DynamoDB
 @prompts_bp.route("/<id>", methods=["DELETE"])
 @login_required
+@rate_limited("write")
 def delete_prompt(id):
-    prompt_to_delete = get_specific_prompt(id)
-
-    if not prompt_to_delete:
-        return jsonify({"error": "Prompt doesn't exist"}), 404
-    
     user_id = get_user_id_from_request()
+    status = delete_prompt_by_id(id, user_id)
 
-    if user_id != prompt_to_delete["user_id"]:
+    if status == "missing":
+        return jsonify({"error": "Prompt doesn't exist"}), 404
+    if status == "forbidden":
         return jsonify({"error": "User doesn't have permission"}), 403
-    
-    delete_prompt_by_id(id)
+
     return jsonify({"message": f"Success: Prompt {id} deleted"}), 200
 
@@ -0,0 +1,137 @@
+from functools import wraps
+from flask import request, jsonify
+import math
+import sqlite3
+import threading
+import time
+from utils import get_user_id_from_request
+from config import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_SQLITE_PATH, RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_READ_RATE, RATE_LIMIT_READ_BURST, RATE_LIMIT_WRITE_RATE, RATE_LIMIT_WRITE_BURST
+)
+
+
+# Tokens added per second and bucket size for each kind of route
+LIMITS = {
+    "read": (RATE_LIMIT_READ_RATE, RATE_LIMIT_READ_BURST),
+    "write": (RATE_LIMIT_WRITE_RATE, RATE_LIMIT_WRITE_BURST),
+}
+
+
+# TOKEN BUCKET
+# A bucket holds up to `burst` tokens and refills at `rate` per second; each
+# request takes one. Returns (tokens, retry_after) after trying to take
+# `cost` tokens at time `now`; retry_after is 0 when the request is allowed.
+def take_tokens(tokens, updated, now, rate, burst, cost=1):
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0
+    return tokens, (cost - tokens) / rate
+
+
+# In-process buckets, for a single worker
+class MemoryBucketStore:
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens, retry_after = take_tokens(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+
+            # Full buckets hold nothing a new one wouldn't, so they can go
+            if len(self._buckets) > self.max_keys:
+                self._buckets = {
+                    key: bucket for key, bucket in self._buckets.items()
+                    if now - bucket[1] < burst / rate
+                }
+            return retry_after
+
+
+# Buckets in a SQLite file shared by every worker process on the host.
+# Each take is one IMMEDIATE transaction, so workers can't race on a bucket.
+class SqliteBucketStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", [key]).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens, retry_after = take_tokens(tokens, updated, now, rate, burst, cost)
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", [key, tokens, now]
+            )
+            connection.execute("COMMIT")
+            return retry_after
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+
+def open_bucket_store(backend=RATE_LIMIT_BACKEND):
+    if backend == "off":
+        return None
+    if backend == "memory":
+        return MemoryBucketStore(RATE_LIMIT_MAX_KEYS)
+    if backend == "sqlite":
+        return SqliteBucketStore(RATE_LIMIT_SQLITE_PATH)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+bucket_store = open_bucket_store()
+
+_stats_lock = threading.Lock()
+_limited = {}
+
+
+def rate_limit_stats():
+    with _stats_lock:
+        return {"backend": RATE_LIMIT_BACKEND, "limited": dict(_limited)}
+
+
+# RATE LIMITED DECORATOR
+# Goes under @login_required. Each user gets one bucket per route, sized by
+# the route's kind ("read" or "write"); an empty bucket answers 429 with
+# Retry-After before the route touches storage.
+def rate_limited(kind):
+    rate, burst = LIMITS[kind]
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if bucket_store is None:
+                return f(*args, **kwargs)
+
+            user_id = get_user_id_from_request()
+            retry_after = bucket_store.take(f"{user_id}:{request.endpoint}", rate, burst)
+            if retry_after:
+                with _stats_lock:
+                    _limited[request.endpoint] = _limited.get(request.endpoint, 0) + 1
+                response = jsonify({"error": "Too many requests"})
+                response.headers["Retry-After"] = str(math.ceil(retry_after))
+                return response, 429
+
+            return f(*args, **kwargs)
+
+        return decorated_function
+    return decorator
@@ -0,0 +1,26 @@
+import random
+
+
+# PROMPT SAMPLING
+# Draws k distinct prompts from several pools (e.g. the cached admin prompts
+# for a level plus the user's own) without copying or shuffling them: only
+# k random positions are picked and mapped back to their pool.
+def sample_prompts(pools, k):
+    sizes = [len(pool) for pool in pools]
+    total = sum(sizes)
+    if total == 0:
+        return []
+
+    picked = []
+    for position in random.sample(range(total), min(k, total)):
+        for pool, size in zip(pools, sizes):
+            if position < size:
+                picked.append(pool[position])
+                break
+            position -= size
+    return picked
+
+
+def choose_prompt(pools):
+    picked = sample_prompts(pools, 1)
+    return picked[0] if picked else None
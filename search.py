@@ -0,0 +1,266 @@
+from collections import Counter, OrderedDict
+import bisect
+import heapq
+import math
+import re
+import threading
+from catalog import normalize_level
+
+
+# Words too common to help find a prompt; they are left out of the index and queries
+STOP_WORDS = frozenset(
+    "a about an and are as at be but by can could did do does for from had has have how i if in into is it "
+    "its me my of on or so than that the their them then there they this to was we were what when where "
+    "which who why will with would you your".split()
+)
+# Query words this long or longer also match the words they begin ("conf" -> "confess")
+MIN_PREFIX_LENGTH = 3
+# Longer prefixes are more specific, so only the first this many matching words are used
+MAX_PREFIX_TERMS = 64
+PREFIX_WEIGHT = 0.5
+
+
+def tokenize(text):
+    words = re.findall(r"[a-z0-9]+", str(text).lower().replace("'", ""))
+    return [word for word in words if word not in STOP_WORDS]
+
+
+# SEARCH INDEX
+# Inverted index over a set of prompts: each word maps to the prompts holding
+# it (weighted by how often), and a sorted vocabulary finds the words that
+# start with a prefix by bisection. Prompts are added and removed one at a
+# time, so the index follows writes without being rebuilt.
+class SearchIndex:
+    def __init__(self, prompts=(), version=None):
+        self.version = version
+        self._lock = threading.RLock()
+        self._documents = {}  # prompt_id -> (prompt, normalized level)
+        self._postings = {}   # word -> {prompt_id: term weight, 1 + log(count)}
+        self._terms = []      # sorted vocabulary
+
+        for prompt in prompts:
+            self._add(prompt, keep_sorted=False)
+        self._terms.sort()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _add(self, prompt, keep_sorted=True):
+        prompt_id = prompt["prompt_id"]
+        if prompt_id in self._documents:
+            self._remove(prompt_id)
+
+        self._documents[prompt_id] = (prompt, normalize_level(prompt.get("level")))
+        for term, count in Counter(tokenize(prompt.get("text", ""))).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self._terms, term)
+                else:
+                    self._terms.append(term)
+            postings[prompt_id] = 1 + math.log(count)
+
+    def _remove(self, prompt_id):
+        document = self._documents.pop(prompt_id, None)
+        if document is None:
+            return
+
+        for term in set(tokenize(document[0].get("text", ""))):
+            postings = self._postings[term]
+            del postings[prompt_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def add(self, prompt):
+        with self._lock:
+            self._add(prompt)
+
+    def remove(self, prompt_id):
+        with self._lock:
+            self._remove(prompt_id)
+
+    # Brings the index in line with `prompts`, touching only the prompts that
+    # were added, removed or changed
+    def sync(self, prompts, version):
+        with self._lock:
+            if self.version == version:
+                return
+
+            current = {prompt["prompt_id"]: prompt for prompt in prompts}
+            for prompt_id in [prompt_id for prompt_id in self._documents if prompt_id not in current]:
+                self._remove(prompt_id)
+            for prompt_id, prompt in current.items():
+                indexed = self._documents.get(prompt_id)
+                if indexed is None or indexed[0] is not prompt and indexed[0] != prompt:
+                    self._add(prompt)
+            self.version = version
+
+    # Indexed words equal to `token` or, for long enough tokens, starting with it
+    def expand(self, token):
+        with self._lock:
+            if len(token) < MIN_PREFIX_LENGTH:
+                return [token] if token in self._postings else []
+
+            terms = []
+            position = bisect.bisect_left(self._terms, token)
+            while position < len(self._terms) and len(terms) < MAX_PREFIX_TERMS:
+                term = self._terms[position]
+                if not term.startswith(token):
+                    break
+                terms.append(term)
+                position += 1
+            return terms
+
+    def document_frequency(self, term):
+        postings = self._postings.get(term)
+        return len(postings) if postings else 0
+
+    # Scores the prompts matching every token (each through any of its
+    # expansions). `weights` maps each expanded word to its weight; a prompt
+    # matching several expansions of a token scores through the heaviest one.
+    # Returns ({prompt_id: score}, scale); multiply a score by scale to
+    # compare it across indexes.
+    def _scores(self, expansions, weights, level):
+        # A single word ranks prompts by its postings alone, so skip rescoring them
+        if len(expansions) == 1 and len(expansions[0]) == 1 and level is None:
+            term = expansions[0][0]
+            return self._postings.get(term, {}), weights[term]
+
+        # Start from the token with the fewest candidates so later tokens only check those
+        order = sorted(expansions, key=lambda terms: sum(self.document_frequency(term) for term in terms))
+
+        scores = None
+        for terms in order:
+            token_scores = {}
+            # Lighter words first, so a heavier word's score replaces theirs
+            for term in sorted(terms, key=weights.get):
+                weight = weights[term]
+                postings = self._postings.get(term, {})
+                if scores is None:
+                    token_scores.update({prompt_id: weight * tf for prompt_id, tf in postings.items()})
+                elif len(scores) < len(postings):
+                    token_scores.update({
+                        prompt_id: weight * postings[prompt_id] for prompt_id in scores if prompt_id in postings
+                    })
+                else:
+                    token_scores.update({
+                        prompt_id: weight * tf for prompt_id, tf in postings.items() if prompt_id in scores
+                    })
+
+            if scores is not None:
+                token_scores = {prompt_id: scores[prompt_id] + value for prompt_id, value in token_scores.items()}
+            scores = token_scores
+            if not scores:
+                return {}, 1.0
+
+        if level is not None:
+            documents = self._documents
+            scores = {prompt_id: value for prompt_id, value in scores.items() if documents[prompt_id][1] == level}
+        return scores, 1.0
+
+    # The `count` best (score, prompt) matches and the number of matches
+    def rank(self, expansions, weights, level=None, count=20):
+        with self._lock:
+            scores, scale = self._scores(expansions, weights, level)
+            top = heapq.nlargest(count, scores, key=scores.__getitem__)
+            return [(scores[prompt_id] * scale, self._documents[prompt_id][0]) for prompt_id in top], len(scores)
+
+
+# Ranks the prompts of several indexes (e.g. the admin catalog and one user's
+# prompts) against a query. Every query word must match; rarer words count
+# for more (idf over all the indexes) and exact words for more than prefixes.
+# Returns (the prompts ranked from `offset` to `offset + limit`, total matches).
+def search(indexes, query, level=None, limit=20, offset=0):
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return [], 0
+
+    level = normalize_level(level) if level is not None else None
+    total_documents = sum(len(index) for index in indexes)
+    expansions = [[index.expand(token) for token in tokens] for index in indexes]
+
+    weights = {}
+    for index_expansions in expansions:
+        for token, terms in zip(tokens, index_expansions):
+            for term in terms:
+                if term not in weights:
+                    frequency = sum(index.document_frequency(term) for index in indexes)
+                    if not frequency:
+                        # Its last prompt was removed since expand(); it matches nothing now
+                        weights[term] = 0.0
+                        continue
+                    idf = math.log(1 + total_documents / frequency)
+                    weights[term] = idf * (1.0 if term == token else PREFIX_WEIGHT)
+
+    # Each index only hands over its best prompts; ties keep index order
+    ranked = []
+    total = 0
+    for position, (index, index_expansions) in enumerate(zip(indexes, expansions)):
+        if all(index_expansions):
+            top, matches = index.rank(index_expansions, weights, level, offset + limit)
+            ranked.extend((score, -position, prompt) for score, prompt in top)
+            total += matches
+
+    page = heapq.nlargest(offset + limit, ranked, key=lambda entry: entry[:2])[offset:]
+    return [prompt for _, _, prompt in page], total
+
+
+# PER-USER INDEXES
+# Bounded LRU of users' search indexes, each tagged with the prompts_version
+# it reflects. A write made by this process updates the cached index in place;
+# a version the index doesn't know (a write elsewhere, or a bulk import)
+# rebuilds it from `loader` on the next search.
+class SearchIndexCache:
+    def __init__(self, loader, max_users):
+        self.loader = loader
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, version):
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(user_id)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        index = SearchIndex(self.loader(user_id), version)
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    # Applies one write that moved the user's prompts to `version`
+    def _apply(self, user_id, version, change):
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                return
+            if index.version is not None and version is not None and index.version + 1 == version:
+                change(index)
+                index.version = version
+            else:
+                del self._indexes[user_id]
+
+    def prompt_added(self, user_id, prompt, version):
+        self._apply(user_id, version, lambda index: index.add(prompt))
+
+    def prompt_removed(self, user_id, prompt_id, version):
+        self._apply(user_id, version, lambda index: index.remove(prompt_id))
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "users": len(self._indexes),
+            "max_users": self.max_users,
+        }
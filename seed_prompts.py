@@ -1,11 +1,10 @@
-import boto3
-import uuid
-from config import REGION
-from db import prompts_table
-
-
-# Connect to DynamoDB
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
+import argparse
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from config import ADMIN_USER_ID, SEED_WORKERS, SEED_BATCH_SIZE
+from prompts import prompts_changed, content_prompt_item, write_new_prompts, prompt_error, StoredFingerprints
 
 
 SEED_PROMPTS = [
@@ -62,15 +61,75 @@ SEED_PROMPTS = [
 ]
 
 
-def seed_prompts_data():
-    SYSTEM_USER_ID = "ADMIN"
-    for prompt in SEED_PROMPTS:
-        prompts_table.put_item(Item={
-            "prompt_id": str(uuid.uuid4()),
-            "text": prompt["text"],
-            "level": prompt["level"],
-            "user_id": SYSTEM_USER_ID,
-            "public": True
-        })
+# Streams prompts from an NDJSON file (one {"text", "level"[, "user_id"]}
+# object per line) or a CSV file with text and level (and optionally
+# user_id) columns, without loading the file into memory
+def read_seed_file(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def seed_item(prompt):
+    return content_prompt_item(prompt["text"], prompt["level"], prompt.get("user_id") or ADMIN_USER_ID)
+
+
+# SEED PROMPTS
+# Writes prompts in batches of SEED_BATCH_SIZE, up to SEED_WORKERS batches at
+# a time. Prompts already stored are skipped, so running it again writes
+# nothing. At most two batches per worker are held in memory, so large seed
+# files stream through.
+def seed_prompts_data(prompts=None, workers=SEED_WORKERS, batch_size=SEED_BATCH_SIZE):
+    prompts = iter(SEED_PROMPTS if prompts is None else prompts)
+    total = 0
+    written = 0
+    skipped = 0
+    owners = set()
+
+    def collect(done):
+        nonlocal written
+        for future in done:
+            new_items = future.result()
+            written += len(new_items)
+            owners.update(item["user_id"] for item in new_items)
+
+    stored = StoredFingerprints()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch in iter(lambda: list(islice(prompts, batch_size)), []):
+            total += len(batch)
+            items = {}
+            for prompt in batch:
+                if prompt_error(prompt):
+                    skipped += 1
+                    continue
+                item = seed_item(prompt)
+                items[item["prompt_id"]] = item
+            if not items:
+                continue
+
+            pending.add(executor.submit(write_new_prompts, items, stored))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        collect(pending)
+
+    for user_id in owners:
+        prompts_changed(user_id)
+
+    print(f"Seeded {written} prompts ({total - written - skipped} already present, {skipped} invalid).")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed prompts, by default the built-in ADMIN prompts.")
+    parser.add_argument("path", nargs="?", help="NDJSON or CSV file of prompts to seed")
+    parser.add_argument("--workers", type=int, default=SEED_WORKERS)
+    args = parser.parse_args()
 
-    print(f"Seeded {len(SEED_PROMPTS)} prompts to DynamoDB.")
+    seed_prompts_data(read_seed_file(args.path) if args.path else None, workers=args.workers)
@@ -1,120 +1,378 @@
 from flask import Blueprint, request, jsonify
-from utils import get_user_id_from_request, login_required
+from utils import (
+    get_user_id_from_request, login_required, make_etag, set_private_etag, not_modified_response,
+    encode_cursor, decode_cursor
+)
+from ratelimit import rate_limited
 from db import sessions_table
-from prompts import get_all_admin_prompts, get_all_user_prompts
+from prompts import get_admin_and_user_prompts, get_prompts_by_ids
+from sampling import sample_prompts
+from config import SESSION_TTL_DAYS
 from datetime import datetime
-import random
+import json
+import time
 
 sessions_bp = Blueprint("sessions", __name__)
 
+SESSION_PROMPT_COUNT = 10
+MAX_WRITE_ATTEMPTS = 3
+DEFAULT_SESSION_PAGE_SIZE = 20
+MAX_SESSION_PAGE_SIZE = 100
+# Read for session listings instead of the prompts and responses
+SESSION_SUMMARY_ATTRIBUTES = ["session_id", "created_at", "prompt_count", "answered_count", "expires_at"]
+# Keeps a batch's DynamoDB UpdateExpression well under the 4 KB expression limit
+MAX_BATCH_RESPONSES = 25
+BATCH_STATUSES = {
+    "recorded": "recorded",
+    "exists": "already_exists",
+    "prompt_not_found": "not_found",
+    "conflict": "conflict"
+}
+
 # Create Session
+# Sessions store only prompt IDs and a responses map keyed by prompt_id; the
+# prompt text is filled in on read. Each answer can then be written with one
+# conditional update (see record_responses), which also keeps answered_count
+# current for session listings. expires_at (epoch seconds) is the Sessions
+# table's TTL attribute.
 def create_user_session(user_id, session_id, prompts):
-    sessions_table.put_item(Item={
+    session = {
         'session_id': session_id,
         'user_id': user_id,
-        'prompts': prompts, 
+        'prompt_ids': [prompt['prompt_id'] for prompt in prompts],
+        'responses': {prompt['prompt_id']: None for prompt in prompts},
+        'prompt_count': len(prompts),
+        'answered_count': 0,
+        'version': 1,
         'created_at': datetime.utcnow().isoformat() + "Z"
-    })
+    }
+    if SESSION_TTL_DAYS:
+        session['expires_at'] = int(time.time()) + SESSION_TTL_DAYS * 86400
+
+    sessions_table.put(session)
     return jsonify({'Created Session': session_id})
 
 
+# DynamoDB deletes expired items up to a few days late, so reads skip them
+def is_expired(item):
+    return "expires_at" in item and item["expires_at"] <= time.time()
+
+
 # Get 10 Prompts for Session
 def session_prompts(user_id, level=None):
-    admin_prompts = get_all_admin_prompts()
-    user_prompts = get_all_user_prompts(user_id)
-    all_prompts = admin_prompts + user_prompts
+    admin_prompts, user_prompts = get_admin_and_user_prompts(user_id, level)
 
-    if level:
-        all_prompts = [p for p in all_prompts if level.lower() == p.get("level").lower()]
+    selected_prompts = sample_prompts([admin_prompts, user_prompts], SESSION_PROMPT_COUNT)
 
-    random.shuffle(all_prompts)
-    selected_prompts = all_prompts[:10]
-    
     response = []
     for prompt in selected_prompts:
         response.append({
             'prompt_id': prompt.get("prompt_id"),
             'text': prompt.get('text'),
-            'level': prompt.get('level'),
-            'response': None
+            'level': prompt.get('level')
         })
 
     return response
 
 # Get Specific Session
 def get_session_by_id(session_id, user_id):
-    response = sessions_table.get_item(
-        Key={
-            "user_id": user_id,
-            "session_id": session_id
-        }
-    )
-
-    return response.get("Item") #Will return None if not found
+    item = sessions_table.get({
+        "user_id": user_id,
+        "session_id": session_id
+    }) #Will return None if not found
+    if item is None or is_expired(item):
+        return None
+    return item
 
 
 # Delete Session
+# One delete that returns the session as it was. Sessions are keyed by owner,
+# so another user's session is simply not found. Returns False if there was
+# no (unexpired) session to delete.
 def delete_session_record(session_id, user_id):
-    sessions_table.delete_item(
-        Key={
-            "user_id": user_id,
-            "session_id": session_id
-        }
+    old_item = sessions_table.delete_if({
+        "user_id": user_id,
+        "session_id": session_id
+    })
+    return bool(old_item) and not is_expired(old_item)
+
+
+# Session prompts with their responses. Sessions are stored in one of three
+# formats: prompt IDs plus a responses map (current), full prompts plus a
+# responses map, or full prompts each holding its own response (oldest).
+def session_prompt_list(item):
+    responses = item.get('responses')
+
+    if 'prompt_ids' in item:
+        found = get_prompts_by_ids(item['prompt_ids'])
+        prompts = []
+        for prompt_id in item['prompt_ids']:
+            prompt = found.get(prompt_id, {})
+            prompts.append({
+                'prompt_id': prompt_id,
+                'text': prompt.get('text'),
+                'level': prompt.get('level'),
+                'response': responses.get(prompt_id)
+            })
+        return prompts
+
+    prompts = item.get('prompts')
+    if prompts is None or responses is None:
+        return prompts
+
+    return [dict(prompt, response=responses.get(prompt['prompt_id'])) for prompt in prompts]
+
+
+# List Sessions
+# Answered and total prompt counts of a full session item, for sessions
+# created before the counts were stored
+def count_responses(item):
+    if 'responses' in item:
+        responses = item['responses'].values()
+    else:
+        responses = [prompt.get('response') for prompt in item.get('prompts') or []]
+    return sum(response is not None for response in responses), len(responses)
+
+
+# Returns one page of the user's session summaries, newest first, plus the
+# key to continue from. Only the summary attributes are read; older sessions
+# without stored counts are counted from one batch get of the full items.
+def list_user_sessions(user_id, limit, start_key=None):
+    items, last_key = sessions_table.query(
+        "user_id", user_id, limit, start_key,
+        order_by="created_at", descending=True, attributes=SESSION_SUMMARY_ATTRIBUTES
     )
 
+    items = [item for item in items if not is_expired(item)]
+
+    uncounted = [item["session_id"] for item in items if "prompt_count" not in item]
+    counts = {}
+    if uncounted:
+        keys = [{"user_id": user_id, "session_id": session_id} for session_id in uncounted]
+        for item in sessions_table.batch_get(keys):
+            counts[item["session_id"]] = count_responses(item)
+
+    summaries = []
+    for item in items:
+        answered, total = counts.get(
+            item["session_id"], (item.get("answered_count", 0), item.get("prompt_count", 0))
+        )
+        summaries.append({
+            "session_id": item["session_id"],
+            "created_at": item["created_at"],
+            "answered": answered,
+            "total": total
+        })
+
+    return summaries, last_key
+
+
+# ETag of a user's session: its version counter, or for older sessions
+# without one, a hash of the stored item
+def session_etag(user_id, session_id, item):
+    if "version" in item:
+        return make_etag("session", user_id, session_id, item["version"])
+    return make_etag("session", user_id, session_id, json.dumps(item, sort_keys=True, default=str))
+
 
 # Get Session Prompts
+# When the client sends If-None-Match, only the session's version is read
+# first, so an unchanged session is answered with a 304 without loading it.
 def get_session_prompts(session_id, user_id):
-    response = sessions_table.get_item(
-        Key={
-            "user_id": user_id,
-            "session_id": session_id
-        }
-    )
+    key = {"user_id": user_id, "session_id": session_id}
 
-    item = response.get("Item")
+    if request.if_none_match:
+        meta = sessions_table.get(key, attributes=["version", "expires_at"])
+        if meta is None or is_expired(meta):
+            return jsonify({'error': 'Session not found'}), 404
+        if "version" in meta:
+            cached = not_modified_response(session_etag(user_id, session_id, meta))
+            if cached:
+                return cached
+
+    item = get_session_by_id(session_id, user_id)
 
     if not item:
         return jsonify({'error': 'Session not found'}), 404
-    
-    prompts = item.get('prompts')
+
+    etag = session_etag(user_id, session_id, item)
+    cached = not_modified_response(etag)
+    if cached:
+        return cached
+
+    prompts = session_prompt_list(item)
     if prompts is None:
         return jsonify({'error': 'Prompts not found for this session'}), 404
 
-    return jsonify({'prompts': prompts}), 200
+    response = jsonify({'prompts': prompts})
+    set_private_etag(response, etag)
+    return response, 200
+
+
+# Where a prompt's response is stored in a session item, given the item as
+# returned by a failed condition. Returns (status, value_or_list_index).
+def locate_response(item, prompt_id):
+    if not item:
+        return "session_not_found", None
+
+    if 'responses' in item:
+        if prompt_id not in item['responses']:
+            return "prompt_not_found", None
+        if item['responses'][prompt_id] is not None:
+            return "exists", item['responses'][prompt_id]
+        return "open", None
+
+    prompts = item.get('prompts')
+    if prompts is None:
+        return "prompts_not_found", None
+
+    for index, prompt in enumerate(prompts):
+        if prompt["prompt_id"] == prompt_id:
+            if prompt.get("response") is not None:
+                return "exists", prompt["response"]
+            return "open_legacy", index
+
+    return "prompt_not_found", None
+
+
+# Builds one conditional update that sets every pending answer, each of them
+# required to still be null. legacy_indexes maps prompt_id -> list index for
+# sessions in the old list format, otherwise the responses map is used.
+# Returns (assignments, expected) for Table.update_if_null.
+def build_responses_update(pending, legacy_indexes=None):
+    assignments = []
+    expected = []
+
+    for prompt_id, response_text in pending.items():
+        if legacy_indexes is None:
+            assignments.append((("responses", prompt_id), response_text))
+        else:
+            index = legacy_indexes[prompt_id]
+            assignments.append((("prompts", index, "response"), response_text))
+            expected.append((("prompts", index, "prompt_id"), prompt_id))
+
+    return assignments, expected
+
+
+# Record Responses
+# Writes any number of answers with one conditional update and no read
+# first. The condition (responses still null) makes concurrent answers safe.
+# If it fails, the old item returned with the failure tells which answers
+# can't be written; the rest are retried (as are answers to sessions in the
+# old list format, which are written by list index).
+# Returns {prompt_id: (status, existing_response)}.
+def record_responses(session_id, user_id, answers):
+    results = {}
+    pending = dict(answers)
+    legacy_indexes = None
+    now = int(time.time())
+
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        if not pending:
+            break
+
+        # Expired sessions read as missing, so they can't be answered either
+        assignments, expected = build_responses_update(pending, legacy_indexes)
+        old_item = sessions_table.update_if_null(
+            {"user_id": user_id, "session_id": session_id}, assignments, expected,
+            increments={"version": 1, "answered_count": len(pending)},
+            expected_after=[(("expires_at",), now)]
+        )
+        if old_item is None:
+            for prompt_id in pending:
+                results[prompt_id] = ("recorded", None)
+            return results
+
+        if "expires_at" in old_item and old_item["expires_at"] <= now:
+            old_item = {}
+
+        if old_item and 'responses' not in old_item:
+            legacy_indexes = {}
+
+        still_open = {}
+        for prompt_id, response_text in pending.items():
+            status, value = locate_response(old_item, prompt_id)
+            if status == "open_legacy":
+                legacy_indexes[prompt_id] = value
+                still_open[prompt_id] = response_text
+            elif status == "open":
+                still_open[prompt_id] = response_text
+            else:
+                results[prompt_id] = (status, value)
+        pending = still_open
+
+    # Concurrent writers kept changing the session between attempts
+    for prompt_id in pending:
+        results[prompt_id] = ("conflict", None)
+    return results
+
+
+def record_response(session_id, user_id, prompt_id, response_text):
+    return record_responses(session_id, user_id, {prompt_id: response_text})[prompt_id]
 
 
 # Response Helper Function
 def prompt_response(session_id, data, user_id):
-    if "prompt_id" not in data or "response" not in data:
+    if not isinstance(data, dict) or "prompt_id" not in data or "response" not in data:
         return jsonify({"error": "Missing prompt_id or response"}), 400
+    if not isinstance(data["prompt_id"], str):
+        return jsonify({"error": "prompt_id must be a string"}), 400
+    # A null response would read as unanswered yet still be counted
+    if data["response"] is None:
+        return jsonify({"error": "response must not be null"}), 400
+
+    status, value = record_response(session_id, user_id, data["prompt_id"], data["response"])
+
+    if status == "recorded":
+        return jsonify({"status": "success", "message": "Response recorded"}), 201
+    if status == "exists":
+        return jsonify({"Response Already Exists": value}), 403
+    if status == "session_not_found":
+        return jsonify({'error': 'Session not found'}), 404
+    if status == "prompts_not_found":
+        return jsonify({'error': 'Prompts not found for this session'}), 404
+    if status == "conflict":
+        return jsonify({"error": "Session was modified concurrently, please retry"}), 409
+    return jsonify({"error": "Prompt ID not found in session"}), 404
+
 
-    response = sessions_table.get_item(
-        Key={
-            "user_id": user_id,
-            "session_id": session_id
-        }
+# Batch Response Helper Function
+def batch_prompt_response(session_id, data, user_id):
+    answers = data.get("responses") if isinstance(data, dict) else None
+    if not isinstance(answers, list) or not answers:
+        return jsonify({"error": "Missing responses"}), 400
+
+    if len(answers) > MAX_BATCH_RESPONSES:
+        return jsonify({"error": f"At most {MAX_BATCH_RESPONSES} responses per request"}), 400
+
+    for answer in answers:
+        if not isinstance(answer, dict) or "prompt_id" not in answer or "response" not in answer:
+            return jsonify({"error": "Each response needs a prompt_id and response"}), 400
+        if not isinstance(answer["prompt_id"], str):
+            return jsonify({"error": "prompt_id must be a string"}), 400
+        if answer["response"] is None:
+            return jsonify({"error": "response must not be null"}), 400
+
+    results = record_responses(
+        session_id, user_id,
+        {answer["prompt_id"]: answer["response"] for answer in answers}
     )
-    item = response.get("Item")
 
-    if not item:
+    statuses = {status for status, _ in results.values()}
+    if "session_not_found" in statuses:
         return jsonify({'error': 'Session not found'}), 404
-    
-    prompts = item.get('prompts')
-
-    if prompts is None:
+    if "prompts_not_found" in statuses:
         return jsonify({'error': 'Prompts not found for this session'}), 404
 
-    for prompt in prompts:
-        if prompt["prompt_id"] == data["prompt_id"]:
-            if prompt["response"] == None:
-                prompt["response"] = data["response"]
-                sessions_table.put_item(Item=item)
-                return jsonify({"status": "success", "message": "Response recorded"}), 201
-            else:
-                return jsonify({"Response Already Exists": prompt.get('response')}), 403
-    
-    return jsonify({"error": "Prompt ID not found in session"}), 404
+    response = []
+    for prompt_id in dict.fromkeys(answer["prompt_id"] for answer in answers):
+        status, value = results[prompt_id]
+        result = {"prompt_id": prompt_id, "status": BATCH_STATUSES[status]}
+        if status == "exists":
+            result["response"] = value
+        response.append(result)
+
+    return jsonify({"results": response}), 200
 
 
 
@@ -123,12 +381,44 @@ def prompt_response(session_id, data, user_id):
 # --------------------
 
 
+# Lists the user's sessions, newest first, a page at a time:
+# ?limit=N (1-100, default 20) and the next_cursor of the previous page
+@sessions_bp.route("/", methods=["GET"])
+@login_required
+@rate_limited("read")
+def list_sessions():
+    user_id = get_user_id_from_request()
+
+    try:
+        limit = int(request.args.get("limit", DEFAULT_SESSION_PAGE_SIZE))
+        start_key = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        if start_key is not None and (
+            set(start_key) != {"user_id", "session_id", "created_at"} or start_key["user_id"] != user_id
+        ):
+            raise ValueError("Invalid cursor")
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    if limit < 1 or limit > MAX_SESSION_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_SESSION_PAGE_SIZE}"}), 400
+
+    summaries, last_key = list_user_sessions(user_id, limit, start_key)
+    return jsonify({
+        "sessions": summaries,
+        "next_cursor": encode_cursor(last_key) if last_key else None
+    }), 200
+
+
 @sessions_bp.route("/new/<session_id>", methods=["POST"])
 @login_required
+@rate_limited("write")
 def create_session(session_id):
     level = request.args.get("level")
     user_id = get_user_id_from_request()
     prompts = session_prompts(user_id, level)
+    if not prompts:
+        return jsonify({"error": "No prompts found for this level"}), 404
+
     create_user_session(user_id, session_id, prompts)
     return jsonify({"session_id": session_id}), 201
 
@@ -136,6 +426,7 @@ def create_session(session_id):
 
 @sessions_bp.route("/<session_id>", methods=["GET"])
 @login_required
+@rate_limited("read")
 def get_session(session_id):
     user_id = get_user_id_from_request()
     return get_session_prompts(session_id, user_id)
@@ -143,23 +434,29 @@ def get_session(session_id):
 
 @sessions_bp.route("/<session_id>/respond", methods=["POST"])
 @login_required
+@rate_limited("write")
 def respond(session_id):
     user_id = get_user_id_from_request()
     data = request.json
     return prompt_response(session_id, data, user_id)
 
 
+@sessions_bp.route("/<session_id>/respond/batch", methods=["POST"])
+@login_required
+@rate_limited("write")
+def respond_batch(session_id):
+    user_id = get_user_id_from_request()
+    data = request.json
+    return batch_prompt_response(session_id, data, user_id)
+
+
 @sessions_bp.route("/<session_id>", methods=["DELETE"])
 @login_required
+@rate_limited("write")
 def delete_session(session_id):
     user_id = get_user_id_from_request()
-    session_to_delete = get_session_by_id(session_id, user_id)
-
-    if not session_to_delete:
-        return jsonify({"error": "Prompt doesn't exist"}), 404
-    
-    if user_id != session_to_delete["user_id"]:
-        return jsonify({"error": "User doesn't have permission"}), 403
-    
-    delete_session_record(session_id, user_id)
+
+    if not delete_session_record(session_id, user_id):
+        return jsonify({"error": "Session doesn't exist"}), 404
+
     return jsonify({"message": f"Success: Session {session_id} deleted"}), 200
\ No newline at end of file
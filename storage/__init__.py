@@ -0,0 +1,32 @@
+import threading
+from config import STORAGE_BACKEND, SQLITE_PATH
+from storage.base import TABLES, Table, TableSpec
+
+_lock = threading.Lock()
+_tables = {}
+
+
+# OPEN TABLE
+# Returns the process-wide handle for a logical table ("users", "prompts",
+# "sessions") on the backend chosen by STORAGE_BACKEND.
+def open_table(name, backend=None):
+    backend = backend or STORAGE_BACKEND
+    with _lock:
+        if (backend, name) in _tables:
+            return _tables[(backend, name)]
+
+        spec = TABLES[name]
+        if backend == "dynamodb":
+            from storage.dynamo import DynamoTable
+            table = DynamoTable(spec)
+        elif backend == "memory":
+            from storage.memory import MemoryTable
+            table = MemoryTable(spec)
+        elif backend == "sqlite":
+            from storage.sqlite import SqliteTable
+            table = SqliteTable(spec, SQLITE_PATH)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+        _tables[(backend, name)] = table
+        return table
@@ -0,0 +1,192 @@
+# TABLE SPECS
+# Logical tables shared by every backend. `key` lists the primary key
+# attributes; `indexes` maps each attribute that can be queried by equality
+# to the DynamoDB index serving it (None for the base table's partition key).
+# `orderings` maps (attribute, sort attribute) pairs to the index returning
+# that attribute's items sorted by the other; items without the sort
+# attribute are left out of those queries.
+class TableSpec:
+    def __init__(self, name, key, indexes=None, orderings=None):
+        self.name = name
+        self.key = key
+        self.indexes = indexes or {}
+        self.orderings = orderings or {}
+
+
+TABLES = {
+    "users": TableSpec("Users", ["user_id"]),
+    "prompts": TableSpec("Prompts", ["prompt_id"], {
+        "user_id": "UserIndex",
+        "user_level": "UserLevelIndex",
+        "fingerprint": "FingerprintIndex",
+    }),
+    "sessions": TableSpec("Sessions", ["user_id", "session_id"], {
+        "user_id": None,
+        "session_id": "SessionIndex",
+    }, {
+        ("user_id", "created_at"): "UserCreatedIndex",
+    }),
+}
+
+
+# ITEM PATHS
+# Conditional updates address nested values by path, e.g. ("responses", prompt_id)
+# or ("prompts", 3, "response").
+MISSING = object()
+
+
+def get_path(item, path):
+    value = item
+    for part in path:
+        if isinstance(part, int):
+            if not isinstance(value, list) or not 0 <= part < len(value):
+                return MISSING
+            value = value[part]
+        else:
+            if not isinstance(value, dict) or part not in value:
+                return MISSING
+            value = value[part]
+    return value
+
+
+def set_path(item, path, new_value):
+    target = item
+    for part in path[:-1]:
+        target = target[part]
+    target[path[-1]] = new_value
+
+
+# STORAGE TABLE INTERFACE
+class Table:
+    def __init__(self, spec):
+        self.spec = spec
+
+    @property
+    def name(self):
+        return self.spec.name
+
+    def key_of(self, item):
+        return {attribute: item[attribute] for attribute in self.spec.key}
+
+    # Returns the item (only `attributes` of it, if given) or None
+    def get(self, key, attributes=None):
+        raise NotImplementedError
+
+    def put(self, item):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    # Deletes the item only if it exists and every (path, value) in `expected`
+    # matches, in one round trip. Returns the item as it was ({} if it doesn't
+    # exist) whether or not it was deleted, so callers can tell why it wasn't.
+    def delete_if(self, key, expected=()):
+        raise NotImplementedError
+
+    # Sets each (path, value) in `assignments` and removes each attribute in
+    # `removals`, only if the item exists and every (path, value) in
+    # `expected` matches, in one round trip. Returns the item as it was ({} if
+    # it doesn't exist) whether or not it was updated, like delete_if.
+    def update_if(self, key, assignments=(), removals=(), expected=()):
+        raise NotImplementedError
+
+    # Returns the items found (only `attributes` of them, if given), in no
+    # particular order
+    def batch_get(self, keys, attributes=None):
+        raise NotImplementedError
+
+    # Writes every item, replacing any with the same key
+    def batch_put(self, items):
+        raise NotImplementedError
+
+    # Returns up to `limit` items whose `attribute` equals `value`, plus the key
+    # to pass as start_key for the next page (None on the last page).
+    # With `order_by` the items come sorted by that attribute (newest first
+    # if `descending`), see TableSpec.orderings; `attributes` limits the
+    # attributes returned for each item.
+    def query(self, attribute, value, limit=None, start_key=None,
+              order_by=None, descending=False, attributes=None):
+        raise NotImplementedError
+
+    # Sets each (path, value) in `assignments`, but only if every one of those
+    # paths currently holds null, every (path, value) in `expected` matches and
+    # every path in `expected_after` is missing or greater than its value
+    # (e.g. an expiry time after now). Each numeric attribute in `increments`
+    # is raised by its amount in the same write. Returns None on success,
+    # otherwise the item as it was when the condition failed ({} if it
+    # doesn't exist).
+    def update_if_null(self, key, assignments, expected=(), increments=None, expected_after=()):
+        raise NotImplementedError
+
+    # Atomically adds `amount` to a numeric attribute, creating the item or
+    # attribute if needed. Returns the new value.
+    def increment(self, key, attribute, amount=1):
+        raise NotImplementedError
+
+    # Returns up to `limit` items of one of `total_segments` disjoint parts of
+    # the table, plus an opaque key to pass as start_key for the next page
+    # (None on the last page). Segments can be scanned in parallel.
+    def scan(self, segment=0, total_segments=1, limit=None, start_key=None):
+        raise NotImplementedError
+
+    def batch_delete(self, keys):
+        raise NotImplementedError
+
+    # Lazily yields every page of a query
+    def iter_pages(self, attribute, value, page_size=None):
+        start_key = None
+        while True:
+            items, start_key = self.query(attribute, value, page_size, start_key)
+            yield items
+            if not start_key:
+                return
+
+    def iter_query(self, attribute, value):
+        for page in self.iter_pages(attribute, value):
+            yield from page
+
+    def iter_scan(self, segment=0, total_segments=1, page_size=None):
+        start_key = None
+        while True:
+            items, start_key = self.scan(segment, total_segments, page_size, start_key)
+            yield from items
+            if not start_key:
+                return
+
+    # Shared helpers for the local backends
+    @staticmethod
+    def project(item, attributes):
+        if item is None or attributes is None:
+            return item
+        return {name: item[name] for name in attributes if name in item}
+
+    # Key to resume a query after `item`, like DynamoDB's LastEvaluatedKey
+    # for an index: the primary key plus the index's keys
+    def page_key(self, item, attribute=None, order_by=None):
+        key = self.key_of(item)
+        if attribute:
+            key[attribute] = item[attribute]
+        if order_by:
+            key[order_by] = item[order_by]
+        return key
+
+    @staticmethod
+    def apply_increment(item, attribute, amount=1):
+        item[attribute] = item.get(attribute, 0) + amount
+        return item[attribute]
+
+    @staticmethod
+    def expected_hold(item, expected):
+        return all(get_path(item, path) == value for path, value in expected)
+
+    @staticmethod
+    def conditions_hold(item, assignments, expected, expected_after=()):
+        for path, _ in assignments:
+            if get_path(item, path) is not None:
+                return False
+        for path, value in expected_after:
+            current = get_path(item, path)
+            if current is not MISSING and not current > value:
+                return False
+        return Table.expected_hold(item, expected)
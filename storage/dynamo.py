@@ -0,0 +1,262 @@
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from aws import get_resource, lazy_table
+from metrics import instrumented, record_capacity
+from storage.base import Table
+
+
+deserializer = TypeDeserializer()
+BATCH_GET_SIZE = 100
+
+
+# Builds a document path expression such as "#a0.#a1" or "#a0[3].#a1",
+# registering placeholder names for every attribute name used
+def path_expression(path, names):
+    expression = ""
+    for part in path:
+        if isinstance(part, int):
+            expression += f"[{part}]"
+            continue
+
+        placeholder = names.setdefault(part, f"#a{len(names)}")
+        expression += ("." if expression else "") + placeholder
+    return expression
+
+
+# ProjectionExpression arguments reading only `attributes`
+def projection_kwargs(attributes):
+    names = {}
+    expression = ", ".join(path_expression([name], names) for name in attributes)
+    return {
+        "ProjectionExpression": expression,
+        "ExpressionAttributeNames": {placeholder: name for name, placeholder in names.items()}
+    }
+
+
+# DYNAMODB TABLE
+class DynamoTable(Table):
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.table = lazy_table(spec.name)
+
+    @instrumented
+    def get(self, key, attributes=None):
+        get_kwargs = {"Key": key, "ReturnConsumedCapacity": "TOTAL"}
+        if attributes:
+            get_kwargs.update(projection_kwargs(attributes))
+
+        response = self.table.get_item(**get_kwargs)
+        record_capacity(response.get("ConsumedCapacity"))
+        return response.get("Item")
+
+    @instrumented
+    def put(self, item):
+        response = self.table.put_item(Item=item, ReturnConsumedCapacity="TOTAL")
+        record_capacity(response.get("ConsumedCapacity"))
+
+    @instrumented
+    def delete(self, key):
+        response = self.table.delete_item(Key=key, ReturnConsumedCapacity="TOTAL")
+        record_capacity(response.get("ConsumedCapacity"))
+
+    @instrumented
+    def delete_if(self, key, expected=()):
+        names = {}
+        values = {}
+        conditions = [f"attribute_exists({path_expression([self.spec.key[0]], names)})"]
+        for n, (path, value) in enumerate(expected):
+            values[f":e{n}"] = value
+            conditions.append(f"{path_expression(path, names)} = :e{n}")
+
+        delete_kwargs = {
+            "Key": key,
+            "ConditionExpression": " AND ".join(conditions),
+            "ExpressionAttributeNames": {placeholder: name for name, placeholder in names.items()},
+            "ReturnValues": "ALL_OLD",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+            "ReturnConsumedCapacity": "TOTAL"
+        }
+        if values:
+            delete_kwargs["ExpressionAttributeValues"] = values
+
+        try:
+            response = self.table.delete_item(**delete_kwargs)
+            record_capacity(response.get("ConsumedCapacity"))
+            return response.get("Attributes", {})
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            old_item = e.response.get("Item") or {}
+            return {name: deserializer.deserialize(value) for name, value in old_item.items()}
+
+    @instrumented
+    def update_if(self, key, assignments=(), removals=(), expected=()):
+        names = {}
+        values = {}
+        conditions = [f"attribute_exists({path_expression([self.spec.key[0]], names)})"]
+        for n, (path, value) in enumerate(expected):
+            values[f":e{n}"] = value
+            conditions.append(f"{path_expression(path, names)} = :e{n}")
+
+        clauses = []
+        updates = []
+        for n, (path, value) in enumerate(assignments):
+            values[f":v{n}"] = value
+            updates.append(f"{path_expression(path, names)} = :v{n}")
+        if updates:
+            clauses.append("SET " + ", ".join(updates))
+        if removals:
+            clauses.append("REMOVE " + ", ".join(path_expression([attribute], names) for attribute in removals))
+
+        update_kwargs = {
+            "Key": key,
+            "UpdateExpression": " ".join(clauses),
+            "ConditionExpression": " AND ".join(conditions),
+            "ExpressionAttributeNames": {placeholder: name for name, placeholder in names.items()},
+            "ReturnValues": "ALL_OLD",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+            "ReturnConsumedCapacity": "TOTAL"
+        }
+        if values:
+            update_kwargs["ExpressionAttributeValues"] = values
+
+        try:
+            response = self.table.update_item(**update_kwargs)
+            record_capacity(response.get("ConsumedCapacity"))
+            return response.get("Attributes", {})
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            old_item = e.response.get("Item") or {}
+            return {name: deserializer.deserialize(value) for name, value in old_item.items()}
+
+    @instrumented
+    def batch_get(self, keys, attributes=None):
+        keys = list(keys)
+        items = []
+        for start in range(0, len(keys), BATCH_GET_SIZE):
+            request_items = {self.name: {"Keys": keys[start:start + BATCH_GET_SIZE]}}
+            if attributes:
+                request_items[self.name].update(projection_kwargs(attributes))
+            while request_items:
+                response = get_resource("dynamodb").batch_get_item(
+                    RequestItems=request_items, ReturnConsumedCapacity="TOTAL"
+                )
+                record_capacity(response.get("ConsumedCapacity"))
+                items.extend(response["Responses"].get(self.name, []))
+                request_items = response.get("UnprocessedKeys")
+        return items
+
+    @instrumented
+    def batch_put(self, items):
+        # The batch writer sends up to 25 puts per request and resends unprocessed ones
+        with self.table.batch_writer(overwrite_by_pkeys=self.spec.key) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+    @instrumented
+    def query(self, attribute, value, limit=None, start_key=None,
+              order_by=None, descending=False, attributes=None):
+        query_kwargs = {
+            "KeyConditionExpression": Key(attribute).eq(value),
+            "ReturnConsumedCapacity": "TOTAL"
+        }
+        index_name = self.spec.orderings[(attribute, order_by)] if order_by else self.spec.indexes[attribute]
+        if index_name:
+            query_kwargs["IndexName"] = index_name
+        if descending:
+            query_kwargs["ScanIndexForward"] = False
+        if attributes:
+            query_kwargs.update(projection_kwargs(attributes))
+        if limit:
+            query_kwargs["Limit"] = limit
+        if start_key:
+            query_kwargs["ExclusiveStartKey"] = start_key
+
+        response = self.table.query(**query_kwargs)
+        record_capacity(response.get("ConsumedCapacity"))
+        return response["Items"], response.get("LastEvaluatedKey")
+
+    @instrumented
+    def scan(self, segment=0, total_segments=1, limit=None, start_key=None):
+        scan_kwargs = {"ReturnConsumedCapacity": "TOTAL"}
+        if total_segments > 1:
+            scan_kwargs["Segment"] = segment
+            scan_kwargs["TotalSegments"] = total_segments
+        if limit:
+            scan_kwargs["Limit"] = limit
+        if start_key:
+            scan_kwargs["ExclusiveStartKey"] = start_key
+
+        response = self.table.scan(**scan_kwargs)
+        record_capacity(response.get("ConsumedCapacity"))
+        return response["Items"], response.get("LastEvaluatedKey")
+
+    @instrumented
+    def batch_delete(self, keys):
+        # The batch writer sends up to 25 deletes per request and resends unprocessed ones
+        with self.table.batch_writer() as batch:
+            for key in keys:
+                batch.delete_item(Key=key)
+
+    @instrumented
+    def update_if_null(self, key, assignments, expected=(), increments=None, expected_after=()):
+        names = {}
+        values = {":null": "NULL"}
+        updates = []
+        conditions = []
+
+        for n, (path, value) in enumerate(assignments):
+            expression = path_expression(path, names)
+            values[f":v{n}"] = value
+            updates.append(f"{expression} = :v{n}")
+            conditions.append(f"attribute_type({expression}, :null)")
+
+        for n, (path, value) in enumerate(expected):
+            values[f":e{n}"] = value
+            conditions.append(f"{path_expression(path, names)} = :e{n}")
+
+        for n, (path, value) in enumerate(expected_after):
+            expression = path_expression(path, names)
+            values[f":g{n}"] = value
+            conditions.append(f"(attribute_not_exists({expression}) OR {expression} > :g{n})")
+
+        update_expression = "SET " + ", ".join(updates)
+        if increments:
+            additions = []
+            for n, (attribute, amount) in enumerate(increments.items()):
+                values[f":i{n}"] = amount
+                additions.append(f"{path_expression([attribute], names)} :i{n}")
+            update_expression += " ADD " + ", ".join(additions)
+
+        try:
+            response = self.table.update_item(
+                Key=key,
+                UpdateExpression=update_expression,
+                ConditionExpression=" AND ".join(conditions),
+                ExpressionAttributeNames={placeholder: name for name, placeholder in names.items()},
+                ExpressionAttributeValues=values,
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+                ReturnConsumedCapacity="TOTAL"
+            )
+            record_capacity(response.get("ConsumedCapacity"))
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            old_item = e.response.get("Item") or {}
+            return {name: deserializer.deserialize(value) for name, value in old_item.items()}
+
+    @instrumented
+    def increment(self, key, attribute, amount=1):
+        response = self.table.update_item(
+            Key=key,
+            UpdateExpression="ADD #attribute :amount",
+            ExpressionAttributeNames={"#attribute": attribute},
+            ExpressionAttributeValues={":amount": amount},
+            ReturnValues="UPDATED_NEW",
+            ReturnConsumedCapacity="TOTAL"
+        )
+        record_capacity(response.get("ConsumedCapacity"))
+        return response["Attributes"][attribute]
@@ -0,0 +1,198 @@
+import bisect
+import copy
+import threading
+import zlib
+from metrics import instrumented
+from storage.base import Table, set_path
+
+
+# IN-MEMORY TABLE
+# Thread-safe dict-backed table for tests, local profiling and load tests.
+# Each queryable attribute keeps a sorted list of primary keys per value so
+# queries and pagination don't scan the table; ordered queries keep
+# (sort value, primary key) pairs instead.
+class MemoryTable(Table):
+    def __init__(self, spec):
+        super().__init__(spec)
+        self._lock = threading.RLock()
+        self._items = {}
+        self._indexes = {attribute: {} for attribute in spec.indexes}
+        self._orderings = {ordering: {} for ordering in spec.orderings}
+
+    def _key_tuple(self, key):
+        return tuple(key[attribute] for attribute in self.spec.key)
+
+    # Every (sorted list, entry) pair the item appears in
+    def _index_entries(self, key_tuple, item):
+        for attribute, partitions in self._indexes.items():
+            if attribute in item:
+                yield partitions.setdefault(item[attribute], []), key_tuple
+        for (attribute, order_by), partitions in self._orderings.items():
+            if attribute in item and order_by in item:
+                yield partitions.setdefault(item[attribute], []), (item[order_by], key_tuple)
+
+    def _unindex(self, key_tuple, item):
+        for entries, entry in self._index_entries(key_tuple, item):
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def _index(self, key_tuple, item):
+        for entries, entry in self._index_entries(key_tuple, item):
+            bisect.insort(entries, entry)
+
+    def clear(self):
+        with self._lock:
+            self._items = {}
+            self._indexes = {attribute: {} for attribute in self.spec.indexes}
+            self._orderings = {ordering: {} for ordering in self.spec.orderings}
+
+    @instrumented
+    def get(self, key, attributes=None):
+        with self._lock:
+            item = self._items.get(self._key_tuple(key))
+            return copy.deepcopy(self.project(item, attributes))
+
+    @instrumented
+    def put(self, item):
+        item = copy.deepcopy(item)
+        key_tuple = self._key_tuple(item)
+        with self._lock:
+            if key_tuple in self._items:
+                self._unindex(key_tuple, self._items[key_tuple])
+            self._items[key_tuple] = item
+            self._index(key_tuple, item)
+
+    @instrumented
+    def delete(self, key):
+        key_tuple = self._key_tuple(key)
+        with self._lock:
+            item = self._items.pop(key_tuple, None)
+            if item is not None:
+                self._unindex(key_tuple, item)
+
+    @instrumented
+    def delete_if(self, key, expected=()):
+        key_tuple = self._key_tuple(key)
+        with self._lock:
+            item = self._items.get(key_tuple)
+            if item is None:
+                return {}
+            if self.expected_hold(item, expected):
+                del self._items[key_tuple]
+                self._unindex(key_tuple, item)
+            return copy.deepcopy(item)
+
+    @instrumented
+    def update_if(self, key, assignments=(), removals=(), expected=()):
+        key_tuple = self._key_tuple(key)
+        with self._lock:
+            item = self._items.get(key_tuple)
+            if item is None:
+                return {}
+            old_item = copy.deepcopy(item)
+            if self.expected_hold(item, expected):
+                self._unindex(key_tuple, item)
+                for path, value in assignments:
+                    set_path(item, path, copy.deepcopy(value))
+                for attribute in removals:
+                    item.pop(attribute, None)
+                self._index(key_tuple, item)
+            return old_item
+
+    @instrumented
+    def batch_get(self, keys, attributes=None):
+        with self._lock:
+            found = [self._items.get(self._key_tuple(key)) for key in keys]
+            return [copy.deepcopy(self.project(item, attributes)) for item in found if item is not None]
+
+    @instrumented
+    def batch_put(self, items):
+        items = [copy.deepcopy(item) for item in items]
+        with self._lock:
+            for item in items:
+                key_tuple = self._key_tuple(item)
+                if key_tuple in self._items:
+                    self._unindex(key_tuple, self._items[key_tuple])
+                self._items[key_tuple] = item
+                self._index(key_tuple, item)
+
+    @instrumented
+    def query(self, attribute, value, limit=None, start_key=None,
+              order_by=None, descending=False, attributes=None):
+        with self._lock:
+            if order_by:
+                entries = self._orderings[(attribute, order_by)].get(value, [])
+                start = (start_key[order_by], self._key_tuple(start_key)) if start_key else None
+            else:
+                entries = self._indexes[attribute].get(value, [])
+                start = self._key_tuple(start_key) if start_key else None
+
+            if descending:
+                end = bisect.bisect_left(entries, start) if start else len(entries)
+                begin = max(end - limit, 0) if limit else 0
+                page = entries[begin:end][::-1]
+                more = begin > 0
+            else:
+                begin = bisect.bisect_right(entries, start) if start else 0
+                end = begin + limit if limit else len(entries)
+                page = entries[begin:end]
+                more = end < len(entries)
+
+            key_tuples = [entry[1] for entry in page] if order_by else page
+            items = [self._items[key_tuple] for key_tuple in key_tuples]
+            last_key = self.page_key(items[-1], attribute, order_by) if more and items else None
+            return [copy.deepcopy(self.project(item, attributes)) for item in items], last_key
+
+    # Segments split the keys by a hash; pages follow primary key order
+    @instrumented
+    def scan(self, segment=0, total_segments=1, limit=None, start_key=None):
+        with self._lock:
+            key_tuples = sorted(
+                key_tuple for key_tuple in self._items
+                if zlib.crc32(repr(key_tuple).encode()) % total_segments == segment
+            )
+            start = bisect.bisect_right(key_tuples, self._key_tuple(start_key)) if start_key else 0
+            end = start + limit if limit else len(key_tuples)
+
+            items = [copy.deepcopy(self._items[key_tuple]) for key_tuple in key_tuples[start:end]]
+            last_key = self.key_of(items[-1]) if end < len(key_tuples) and items else None
+            return items, last_key
+
+    @instrumented
+    def batch_delete(self, keys):
+        with self._lock:
+            for key in keys:
+                key_tuple = self._key_tuple(key)
+                item = self._items.pop(key_tuple, None)
+                if item is not None:
+                    self._unindex(key_tuple, item)
+
+    @instrumented
+    def update_if_null(self, key, assignments, expected=(), increments=None, expected_after=()):
+        with self._lock:
+            item = self._items.get(self._key_tuple(key))
+            if item is None:
+                return {}
+            if not self.conditions_hold(item, assignments, expected, expected_after):
+                return copy.deepcopy(item)
+
+            key_tuple = self._key_tuple(key)
+            self._unindex(key_tuple, item)
+            for path, value in assignments:
+                set_path(item, path, copy.deepcopy(value))
+            for attribute, amount in (increments or {}).items():
+                self.apply_increment(item, attribute, amount)
+            self._index(key_tuple, item)
+            return None
+
+    @instrumented
+    def increment(self, key, attribute, amount=1):
+        key_tuple = self._key_tuple(key)
+        with self._lock:
+            item = self._items.get(key_tuple)
+            if item is None:
+                item = dict(key)
+                self._items[key_tuple] = item
+                self._index(key_tuple, item)
+            return self.apply_increment(item, attribute, amount)
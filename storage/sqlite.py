@@ -0,0 +1,274 @@
+import json
+import sqlite3
+import threading
+from decimal import Decimal
+from metrics import instrumented
+from storage.base import Table, set_path
+
+
+def encode_value(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_item(item):
+    return json.dumps(item, default=encode_value)
+
+
+# SQLITE TABLE
+# Stores each item as JSON next to indexed columns for its key and queryable
+# attributes. Connections are per thread; writes that check a condition run
+# in an IMMEDIATE transaction so they are atomic across threads and processes.
+class SqliteTable(Table):
+    def __init__(self, spec, path):
+        super().__init__(spec)
+        self.path = path
+        self._local = threading.local()
+        self._columns = list(dict.fromkeys(
+            spec.key + list(spec.indexes) + [order_by for _, order_by in spec.orderings]
+        ))
+        self._create_schema()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _create_schema(self):
+        columns = ", ".join(f'"{column}" TEXT' for column in self._columns)
+        primary_key = ", ".join(f'"{column}"' for column in self.spec.key)
+        connection = self._connection()
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.name}" ({columns}, data TEXT NOT NULL, PRIMARY KEY ({primary_key}))'
+        )
+        # Columns added since the file was created are filled in from the stored JSON
+        existing = {row[1] for row in connection.execute(f'PRAGMA table_info("{self.name}")')}
+        for column in self._columns:
+            if column not in existing:
+                connection.execute(f'ALTER TABLE "{self.name}" ADD COLUMN "{column}" TEXT')
+                connection.execute(f'UPDATE "{self.name}" SET "{column}" = json_extract(data, ?)', [f'$."{column}"'])
+
+        for attribute in self.spec.indexes:
+            index_columns = ", ".join(f'"{column}"' for column in dict.fromkeys([attribute] + self.spec.key))
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "{self.name}_{attribute}" ON "{self.name}" ({index_columns})'
+            )
+        for attribute, order_by in self.spec.orderings:
+            index_columns = ", ".join(f'"{column}"' for column in dict.fromkeys([attribute, order_by] + self.spec.key))
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "{self.name}_{attribute}_{order_by}" ON "{self.name}" ({index_columns})'
+            )
+
+    def _key_clause(self):
+        return " AND ".join(f'"{column}" = ?' for column in self.spec.key)
+
+    def _key_values(self, key):
+        return [key[column] for column in self.spec.key]
+
+    def _write(self, connection, item):
+        placeholders = ", ".join("?" for _ in self._columns)
+        columns = ", ".join(f'"{column}"' for column in self._columns)
+        connection.execute(
+            f'INSERT OR REPLACE INTO "{self.name}" ({columns}, data) VALUES ({placeholders}, ?)',
+            [item.get(column) for column in self._columns] + [dump_item(item)]
+        )
+
+    @instrumented
+    def get(self, key, attributes=None):
+        row = self._connection().execute(
+            f'SELECT data FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+        ).fetchone()
+        return self.project(json.loads(row[0]), attributes) if row else None
+
+    @instrumented
+    def put(self, item):
+        self._write(self._connection(), item)
+
+    @instrumented
+    def delete(self, key):
+        self._connection().execute(
+            f'DELETE FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+        )
+
+    @instrumented
+    def delete_if(self, key, expected=()):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                f'SELECT data FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+            ).fetchone()
+            if row is None:
+                return {}
+
+            item = json.loads(row[0])
+            if self.expected_hold(item, expected):
+                connection.execute(
+                    f'DELETE FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+                )
+            return item
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            if connection.in_transaction:
+                connection.execute("COMMIT")
+
+    @instrumented
+    def update_if(self, key, assignments=(), removals=(), expected=()):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                f'SELECT data FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+            ).fetchone()
+            if row is None:
+                return {}
+
+            item = json.loads(row[0])
+            if self.expected_hold(item, expected):
+                updated = json.loads(row[0])
+                for path, value in assignments:
+                    set_path(updated, path, value)
+                for attribute in removals:
+                    updated.pop(attribute, None)
+                self._write(connection, updated)
+            return item
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            if connection.in_transaction:
+                connection.execute("COMMIT")
+
+    @instrumented
+    def batch_get(self, keys, attributes=None):
+        connection = self._connection()
+        items = []
+        for key in keys:
+            row = connection.execute(
+                f'SELECT data FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+            ).fetchone()
+            if row:
+                items.append(self.project(json.loads(row[0]), attributes))
+        return items
+
+    @instrumented
+    def batch_put(self, items):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for item in items:
+                self._write(connection, item)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    @instrumented
+    def query(self, attribute, value, limit=None, start_key=None,
+              order_by=None, descending=False, attributes=None):
+        sort_columns = ([order_by] if order_by else []) + self.spec.key
+        column_list = ", ".join(f'"{column}"' for column in sort_columns)
+        sql = f'SELECT data FROM "{self.name}" WHERE "{attribute}" = ?'
+        params = [value]
+        if order_by:
+            sql += f' AND "{order_by}" IS NOT NULL'
+
+        if start_key:
+            placeholders = ", ".join("?" for _ in sort_columns)
+            sql += f" AND ({column_list}) {'<' if descending else '>'} ({placeholders})"
+            params += [start_key[column] for column in sort_columns]
+
+        direction = " DESC" if descending else ""
+        sql += " ORDER BY " + ", ".join(f'"{column}"{direction}' for column in sort_columns)
+        if limit:
+            # Fetch one extra row to know whether another page exists
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        items = [json.loads(row[0]) for row in self._connection().execute(sql, params)]
+        last_key = None
+        if limit and len(items) > limit:
+            items = items[:limit]
+            last_key = self.page_key(items[-1], attribute, order_by)
+        return [self.project(item, attributes) for item in items], last_key
+
+    # Segments split the rows by rowid, which also orders the pages
+    @instrumented
+    def scan(self, segment=0, total_segments=1, limit=None, start_key=None):
+        sql = f'SELECT rowid, data FROM "{self.name}" WHERE rowid % ? = ? AND rowid > ? ORDER BY rowid'
+        params = [total_segments, segment, start_key["rowid"] if start_key else 0]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        last_key = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            last_key = {"rowid": rows[-1][0]}
+        return [json.loads(data) for _, data in rows], last_key
+
+    @instrumented
+    def batch_delete(self, keys):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                f'DELETE FROM "{self.name}" WHERE {self._key_clause()}',
+                [self._key_values(key) for key in keys]
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    @instrumented
+    def update_if_null(self, key, assignments, expected=(), increments=None, expected_after=()):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                f'SELECT data FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+            ).fetchone()
+            if row is None:
+                return {}
+
+            item = json.loads(row[0])
+            if not self.conditions_hold(item, assignments, expected, expected_after):
+                return item
+
+            for path, value in assignments:
+                set_path(item, path, value)
+            for attribute, amount in (increments or {}).items():
+                self.apply_increment(item, attribute, amount)
+            self._write(connection, item)
+            return None
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            if connection.in_transaction:
+                connection.execute("COMMIT")
+
+    @instrumented
+    def increment(self, key, attribute, amount=1):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                f'SELECT data FROM "{self.name}" WHERE {self._key_clause()}', self._key_values(key)
+            ).fetchone()
+            item = json.loads(row[0]) if row else dict(key)
+            value = self.apply_increment(item, attribute, amount)
+            self._write(connection, item)
+            connection.execute("COMMIT")
+            return value
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
@@ -1,9 +1,74 @@
-import boto3
-from config import REGION
+from concurrent.futures import ThreadPoolExecutor
+import time
+from boto3.dynamodb.conditions import Attr
+from aws import lazy_resource
+from catalog import user_level_key
 from seed_prompts import seed_prompts_data
 
 
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
+dynamodb = lazy_resource('dynamodb')
+
+
+# Lets prompt reads fetch a single (owner, level) partition instead of every prompt
+USER_LEVEL_INDEX = {
+    "IndexName": "UserLevelIndex",
+    "KeySchema": [
+        {
+            "AttributeName": "user_level",
+            "KeyType": "HASH"
+        }
+    ],
+    "Projection": {
+        "ProjectionType": "ALL"
+    },
+    "ProvisionedThroughput": {
+        "ReadCapacityUnits": 5,
+        "WriteCapacityUnits": 5
+    },
+}
+
+# Finds a prompt by its owner, level and normalized text (see
+# catalog.prompt_fingerprint). Only the key is needed to answer "is there one?"
+FINGERPRINT_INDEX = {
+    "IndexName": "FingerprintIndex",
+    "KeySchema": [
+        {
+            "AttributeName": "fingerprint",
+            "KeyType": "HASH"
+        }
+    ],
+    "Projection": {
+        "ProjectionType": "KEYS_ONLY"
+    },
+    "ProvisionedThroughput": {
+        "ReadCapacityUnits": 5,
+        "WriteCapacityUnits": 5
+    },
+}
+
+# Lists a user's sessions newest first. Only the summary attributes are
+# projected, so pages stay small however many responses a session holds.
+USER_CREATED_INDEX = {
+    "IndexName": "UserCreatedIndex",
+    "KeySchema": [
+        {
+            "AttributeName": "user_id",
+            "KeyType": "HASH"
+        },
+        {
+            "AttributeName": "created_at",
+            "KeyType": "RANGE"
+        }
+    ],
+    "Projection": {
+        "ProjectionType": "INCLUDE",
+        "NonKeyAttributes": ["prompt_count", "answered_count", "expires_at"]
+    },
+    "ProvisionedThroughput": {
+        "ReadCapacityUnits": 5,
+        "WriteCapacityUnits": 5
+    },
+}
 
 def create_users_table():
     try:
@@ -48,6 +113,14 @@ def create_prompts_table():
                 {
                     "AttributeName": "user_id",
                     "AttributeType": "S"
+                },
+                {
+                    "AttributeName": "user_level",
+                    "AttributeType": "S"
+                },
+                {
+                    "AttributeName": "fingerprint",
+                    "AttributeType": "S"
                 }
             ],
             ProvisionedThroughput={
@@ -70,11 +143,96 @@ def create_prompts_table():
                         "ReadCapacityUnits": 5,
                         "WriteCapacityUnits": 5
                     },
-                }
+                },
+                USER_LEVEL_INDEX,
+                FINGERPRINT_INDEX
             ]
         )
     except dynamodb.meta.client.exceptions.ResourceInUseException:
         prompts_table = dynamodb.Table("Prompts")
+        add_user_level_index(prompts_table)
+        add_fingerprint_index(prompts_table)
+
+
+# Tables created before the UserLevelIndex existed get it added in place.
+# The index only covers items with a user_level attribute, see backfill_user_level().
+def add_user_level_index(prompts_table):
+    existing = prompts_table.global_secondary_indexes or []
+    if any(index["IndexName"] == "UserLevelIndex" for index in existing):
+        return
+
+    dynamodb.meta.client.update_table(
+        TableName="Prompts",
+        AttributeDefinitions=[
+            {
+                "AttributeName": "user_level",
+                "AttributeType": "S"
+            }
+        ],
+        GlobalSecondaryIndexUpdates=[
+            {
+                "Create": USER_LEVEL_INDEX
+            }
+        ]
+    )
+
+
+# DynamoDB builds one new index per table at a time, so wait for any other
+# index still being created first. Prompts written before fingerprints were
+# stored are fingerprinted by dedup_prompts.py.
+def add_fingerprint_index(prompts_table):
+    prompts_table.reload()
+    existing = prompts_table.global_secondary_indexes or []
+    if any(index["IndexName"] == "FingerprintIndex" for index in existing):
+        return
+
+    while any(index["IndexStatus"] == "CREATING" for index in existing):
+        time.sleep(5)
+        prompts_table.reload()
+        existing = prompts_table.global_secondary_indexes or []
+
+    dynamodb.meta.client.update_table(
+        TableName="Prompts",
+        AttributeDefinitions=[
+            {
+                "AttributeName": "fingerprint",
+                "AttributeType": "S"
+            }
+        ],
+        GlobalSecondaryIndexUpdates=[
+            {
+                "Create": FINGERPRINT_INDEX
+            }
+        ]
+    )
+
+
+# Sets user_level on prompts written before it was stored. Tombstones of
+# deleted or merged prompts (no user_id) are left out of the indexes on purpose.
+def backfill_user_level():
+    prompts_table = dynamodb.Table("Prompts")
+    scan_kwargs = {
+        "FilterExpression": Attr("user_level").not_exists() & Attr("user_id").exists()
+    }
+    updated = 0
+
+    while True:
+        response = prompts_table.scan(**scan_kwargs)
+        for prompt in response["Items"]:
+            prompts_table.update_item(
+                Key={"prompt_id": prompt["prompt_id"]},
+                UpdateExpression="SET user_level = :user_level",
+                ExpressionAttributeValues={
+                    ":user_level": user_level_key(prompt["user_id"], prompt["level"])
+                }
+            )
+            updated += 1
+
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    print(f"Backfilled user_level on {updated} prompts.")
 
 
 def create_sessions_table():
@@ -99,6 +257,10 @@ def create_sessions_table():
                 {
                     "AttributeName": "session_id",
                     "AttributeType": "S"
+                },
+                {
+                    "AttributeName": "created_at",
+                    "AttributeType": "S"
                 }
             ],
             ProvisionedThroughput={
@@ -121,34 +283,89 @@ def create_sessions_table():
                         "ReadCapacityUnits": 5,
                         "WriteCapacityUnits": 5
                     },
-                }
+                },
+                USER_CREATED_INDEX
             ]
         )
     except dynamodb.meta.client.exceptions.ResourceInUseException:
         sessions_table = dynamodb.Table("Sessions")
+        add_user_created_index(sessions_table)
 
+    enable_session_ttl()
 
-if __name__ == "__main__":
-    # Call table creation 
-    create_users_table()
-    create_prompts_table()
-    create_sessions_table()
 
+# DynamoDB deletes sessions once their expires_at (epoch seconds) has passed,
+# without using write capacity. Sessions written before expires_at was stored
+# never expire; archive_sessions.py removes those by age.
+def enable_session_ttl():
+    client = dynamodb.meta.client
+    client.get_waiter('table_exists').wait(TableName='Sessions')
 
-    # Get table handles for waiters and status
-    users_table = dynamodb.Table("Users")
-    prompts_table = dynamodb.Table("Prompts")
-    sessions_table = dynamodb.Table("Sessions")
+    description = client.describe_time_to_live(TableName="Sessions")["TimeToLiveDescription"]
+    if description.get("TimeToLiveStatus") in ("ENABLED", "ENABLING"):
+        return
 
+    client.update_time_to_live(
+        TableName="Sessions",
+        TimeToLiveSpecification={
+            "Enabled": True,
+            "AttributeName": "expires_at"
+        }
+    )
 
-    users_table.meta.client.get_waiter('table_exists').wait(TableName='Users')
-    prompts_table.meta.client.get_waiter('table_exists').wait(TableName='Prompts')
-    sessions_table.meta.client.get_waiter('table_exists').wait(TableName='Sessions')
 
+# A local secondary index can only be defined when a table is created, so the
+# newest-first listing uses a global one that can be added to existing tables
+def add_user_created_index(sessions_table):
+    existing = sessions_table.global_secondary_indexes or []
+    if any(index["IndexName"] == "UserCreatedIndex" for index in existing):
+        return
+
+    dynamodb.meta.client.update_table(
+        TableName="Sessions",
+        AttributeDefinitions=[
+            {
+                "AttributeName": "user_id",
+                "AttributeType": "S"
+            },
+            {
+                "AttributeName": "created_at",
+                "AttributeType": "S"
+            }
+        ],
+        GlobalSecondaryIndexUpdates=[
+            {
+                "Create": USER_CREATED_INDEX
+            }
+        ]
+    )
+
+
+TABLE_CREATORS = {
+    "Users": create_users_table,
+    "Prompts": create_prompts_table,
+    "Sessions": create_sessions_table,
+}
 
-    print("✅ Table status (Users):", users_table.table_status)
-    print("✅ Table status (Prompts):", prompts_table.table_status)
-    print("✅ Table status (Sessions):", sessions_table.table_status)
 
+def create_and_wait(table_name):
+    TABLE_CREATORS[table_name]()
+    dynamodb.meta.client.get_waiter('table_exists').wait(TableName=table_name)
+    return dynamodb.Table(table_name).table_status
+
+
+# Creates the tables and waits for them concurrently, since each creation
+# mostly waits on DynamoDB
+def create_tables():
+    with ThreadPoolExecutor(max_workers=len(TABLE_CREATORS)) as executor:
+        statuses = dict(zip(TABLE_CREATORS, executor.map(create_and_wait, TABLE_CREATORS)))
+
+    for table_name, status in statuses.items():
+        print(f"✅ Table status ({table_name}):", status)
+
+
+if __name__ == "__main__":
+    create_tables()
 
     seed_prompts_data()
+    backfill_user_level()
@@ -1,28 +1,121 @@
 from functools import wraps
-from flask import request, session, jsonify, abort
+from collections import OrderedDict
+from itertools import islice
+from flask import request, session, jsonify, abort, current_app, g, Response, stream_with_context
+import base64
+import binascii
+import hashlib
+import json
+import threading
+import time
 from jose import jwt
-from config import JWKS, CLIENT_ID, REGION, USER_POOL_ID
+from jwks import KeyStore
+from metrics import timed
+from config import (
+    CLIENT_ID, REGION, USER_POOL_ID, TOKEN_CACHE_MAX_ITEMS,
+    JWKS_URL, JWKS_TIMEOUT, JWKS_REFRESH_INTERVAL, JWKS_MIN_REFETCH_INTERVAL
+)
+
+
+# VERIFIED TOKEN CACHE
+# Bounded LRU of recently verified tokens so repeat requests from the same
+# client skip the RS256 signature check. Keyed by a digest of the token;
+# entries are dropped once the token's exp has passed.
+class VerifiedTokenCache:
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        digest = self._digest(token)
+        with self._lock:
+            claims = self._entries.get(digest)
+            if claims is None:
+                self.misses += 1
+                return None
+
+            if claims.get("exp", 0) <= time.time():
+                del self._entries[digest]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = claims
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_items": self.max_items,
+        }
+
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_MAX_ITEMS)
+key_store = KeyStore(JWKS_URL, JWKS_TIMEOUT, JWKS_REFRESH_INTERVAL, JWKS_MIN_REFETCH_INTERVAL)
+
+
+# GET TOKEN FROM HEADER
+def get_token_from_request():
+    auth_header = request.headers.get("Authorization", "") #Get authorization from header (Bearer token)
+    return auth_header.replace("Bearer ", "") #Obtains just the raw token itself
+
+
+# GET VERIFIED CLAIMS
+# Verifies the request's token at most once per request (kept on flask.g)
+# and reuses claims from recently verified tokens across requests.
+def get_verified_claims():
+    if "claims" in g:
+        return g.claims
+
+    token = get_token_from_request()
+    if not token:
+        raise ValueError("Missing access token")
+
+    claims = token_cache.get(token)
+    if claims is None:
+        with timed("verify_token"):
+            claims = verify_token(token)
+        token_cache.put(token, claims)
+
+    g.claims = claims
+    return claims
 
 
 # LOGIN REQUIRED DECORATOR
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user' not in session:
+        if 'user' in session:
             return f(*args, **kwargs)
 
-        authorization_header = request.headers.get("Authorization", "")
-        token = authorization_header.replace("Bearer ", "")
-
-        if not token:
+        if not get_token_from_request():
             return jsonify({"error": "Missing access token"}), 401
 
         try:
-            claims = verify_token(token)
-            return f(*args, **kwargs)
+            get_verified_claims()
         except Exception:
             return jsonify({"error": "Authentication required"}), 401
 
+        return f(*args, **kwargs)
+
     return decorated_function
 
 
@@ -30,12 +123,9 @@ def login_required(f):
 def get_user_id_from_request():
     if 'user' in session:
         return session["user"].get("sub")
-    
-    auth_header = request.headers.get("Authorization", "") #Get authorization from header (Bearer token)
-    token = auth_header.replace("Bearer ", "") #Obtains just the raw token itself
 
     try:
-        claims = verify_token(token)
+        claims = get_verified_claims()
         return claims["sub"]  # user_id from Cognito
     except Exception:
         abort(401, description="Invalid or missing token")
@@ -45,12 +135,7 @@ def get_user_id_from_request():
 def verify_token(token):
     headers = jwt.get_unverified_header(token)
 
-    key = None
-    for k in JWKS:
-        if k["kid"] == headers["kid"]:
-            key = k
-            break
-
+    key = key_store.get_key(headers.get("kid"))
     if key is None:
         raise ValueError("No matching key found for the given 'kid'")
 
@@ -64,3 +149,63 @@ def verify_token(token):
     return claims
 
 
+# PAGINATION CURSORS
+# Opaque, URL-safe encoding of a pagination position (e.g. a LastEvaluatedKey)
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+# STREAMING JSON
+# Streams an iterable as a JSON array so large lists are never built in memory.
+# Items are encoded STREAM_CHUNK_SIZE at a time to keep per-call overhead low.
+STREAM_CHUNK_SIZE = 500
+
+
+def stream_json_array(items):
+    def generate():
+        yield "["
+        first = True
+        for chunk in iter(lambda: list(islice(iterator, STREAM_CHUNK_SIZE)), []):
+            if not first:
+                yield ","
+            first = False
+            yield current_app.json.dumps(chunk)[1:-1]
+        yield "]"
+
+    iterator = iter(items)
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+# CONDITIONAL GET
+def make_etag(*parts):
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+# Tags a response with its ETag. These responses are per user, so they are
+# marked private: a shared cache must not hand one user's copy to another.
+def set_private_etag(response, etag):
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.vary.add("Authorization")
+    return response
+
+
+# Returns an empty 304 response if the client already holds this ETag, else None.
+# Compared weakly, as compressed responses carry the weak form (see compression.py).
+def not_modified_response(etag):
+    if request.if_none_match.contains_weak(etag):
+        return set_private_etag(Response(status=304), etag)
+    return None